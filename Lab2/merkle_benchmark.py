@@ -0,0 +1,40 @@
+import argparse
+import time
+from merkle_tree import MerkleTree
+
+def benchmark_append(leaf_count: int, appends: int = 1000):
+    transactions = [f"Transaction {i}" for i in range(leaf_count)]
+    tree = MerkleTree(list(transactions))
+
+    start_time = time.perf_counter()
+    for i in range(appends):
+        tree.append(f"Transaction {leaf_count + i}")
+    append_time = (time.perf_counter() - start_time) / appends
+
+    # A full rebuild is what every insert cost before incremental appends
+    transactions.append(f"Transaction {leaf_count}")
+    start_time = time.perf_counter()
+    MerkleTree(transactions)
+    rebuild_time = time.perf_counter() - start_time
+
+    return append_time, rebuild_time
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare incremental MerkleTree appends with full rebuilds')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                      help='Leaf counts to benchmark (default: 10000 100000 1000000)')
+    parser.add_argument('--appends', type=int, default=1000,
+                      help='Appends timed per leaf count (default: 1000)')
+
+    args = parser.parse_args()
+
+    print(f"{'Leaves':>10} {'Append (us)':>12} {'Rebuild (ms)':>13} {'Speedup':>10}")
+    for leaf_count in args.sizes:
+        append_time, rebuild_time = benchmark_append(leaf_count, args.appends)
+        print(f"{leaf_count:>10,} {append_time * 1e6:>12.1f} {rebuild_time * 1e3:>13.1f} "
+              f"{rebuild_time / append_time:>9,.0f}x")
+
+if __name__ == "__main__":
+    main()
+
+# python merkle_benchmark.py --sizes 10000 100000 1000000
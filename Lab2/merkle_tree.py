@@ -1,54 +1,467 @@
+import argparse
 import hashlib
+import json
+import mmap
+import struct
+import time
+from collections import deque
+from collections.abc import Sequence as SequenceABC
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import chain, islice
+from typing import Iterable, List, NamedTuple, Sequence, Union
 from rich.console import Console
 from rich.tree import Tree
 from rich.panel import Panel
 from rich.table import Table
 
 def hash_data(data):
-    return hashlib.sha256(data.encode()).digest()
+    # Transactions may be text or an already-encoded byte string
+    return hashlib.sha256(data.encode() if isinstance(data, str) else data).digest()
 
 def combine_hashes(hash1, hash2):
     return hashlib.sha256(hash1 + hash2).digest()
 
+HASH_SIZE = 32
+
+# Transactions hashed per task when building with several workers
+LEAF_CHUNK_SIZE = 4096
+# Interior levels with fewer nodes are cheaper to hash inline
+PARALLEL_LEVEL_MIN = 1 << 16
+# hashlib releases the GIL for inputs of at least this many bytes, so
+# threads only help when transactions are this large
+THREAD_PAYLOAD_MIN = 2048
+
+# On-disk layout: header, one (byte offset, node count) entry per level,
+# then every level's packed 32-byte nodes, leaves first
+FILE_MAGIC = b"MRKL"
+FILE_VERSION = 1
+FILE_HEADER = struct.Struct("<4sHxxQI4x")
+FILE_LEVEL_ENTRY = struct.Struct("<QQ")
+
+# Nodes drawn per level, and rows in the transaction table, before
+# visualize() elides the rest
+VISUALIZE_MAX_NODES = 16
+
+class HashLevel:
+    """Read-only view of one tree level stored as packed 32-byte slots.
+
+    When the level has an odd node that gets paired with itself, the
+    duplicate is virtual: it is reported by len() and indexing but is not
+    stored.
+    """
+
+    __slots__ = ("_buffer", "count", "padded")
+
+    def __init__(self, buffer: bytearray, count: int, padded: bool):
+        self._buffer = buffer
+        self.count = count
+        self.padded = padded
+
+    def __len__(self):
+        return self.count + self.padded
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("level index out of range")
+        # The virtual duplicate reads the last stored node
+        index = min(index, self.count - 1)
+        return bytes(self._buffer[index * HASH_SIZE:(index + 1) * HASH_SIZE])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def nbytes(self):
+        return len(self._buffer)
+
+def _is_padded(level_idx, count):
+    # Odd levels pair their last node with itself; the leaf level does so
+    # even for a single leaf, interior levels only while above the root
+    return count % 2 == 1 and (level_idx == 0 or count > 1)
+
+def _level_counts(leaf_count):
+    # Stored (unpadded) node count of every level, leaves first
+    counts = [leaf_count]
+    while counts[-1] + _is_padded(len(counts) - 1, counts[-1]) > 1:
+        counts.append((counts[-1] + 1) // 2)
+    return counts
+
+def _as_leaf_hash(leaf: Union[str, bytes]) -> bytes:
+    # Leaves are given either as the transaction itself or as its hash
+    return hash_data(leaf) if isinstance(leaf, str) else bytes(leaf)
+
+def _as_root_hash(root: Union[str, bytes]) -> bytes:
+    return bytes.fromhex(root) if isinstance(root, str) else bytes(root)
+
+class MerkleProof(NamedTuple):
+    index: int
+    leaf_count: int
+    # Sibling hashes from the leaf level upwards; a node paired with its own
+    # duplicate has no entry, the verifier reuses the node itself
+    siblings: List[bytes]
+
+class MerkleMultiProof(NamedTuple):
+    indices: List[int]
+    leaf_count: int
+    # Hashes that cannot be derived from the proven leaves, level by level
+    hashes: List[bytes]
+
+def verify_proof(leaf: Union[str, bytes], proof: MerkleProof, root: Union[str, bytes]) -> bool:
+    if not 0 <= proof.index < proof.leaf_count:
+        return False
+
+    node = _as_leaf_hash(leaf)
+    index = proof.index
+    siblings = iter(proof.siblings)
+    for count in _level_counts(proof.leaf_count)[:-1]:
+        if index == count - 1 and count % 2 == 1:
+            sibling = node
+        else:
+            sibling = next(siblings, None)
+            if sibling is None:
+                return False
+        node = combine_hashes(sibling, node) if index % 2 else combine_hashes(node, sibling)
+        index //= 2
+
+    return next(siblings, None) is None and node == _as_root_hash(root)
+
+def _walk_multi_proof(indices: Sequence[int], leaf_count: int, leaf_hashes, sibling_for):
+    # Shared by proof generation and verification: climb level by level with
+    # the set of known nodes, asking sibling_for(level, index) only for
+    # siblings that are neither known nor the node's own duplicate
+    known = dict(zip(indices, leaf_hashes))
+    for level_idx, count in enumerate(_level_counts(leaf_count)[:-1]):
+        parents = {}
+        for index in sorted(known):
+            parent = index // 2
+            if parent in parents:
+                continue
+            sibling_idx = index ^ 1
+            if sibling_idx >= count:
+                sibling = known[index]
+            elif sibling_idx in known:
+                sibling = known[sibling_idx]
+            else:
+                sibling = sibling_for(level_idx, sibling_idx)
+                if sibling is None:
+                    return None
+            left, right = (sibling, known[index]) if index % 2 else (known[index], sibling)
+            parents[parent] = combine_hashes(left, right)
+        known = parents
+    return known.get(0)
+
+def verify_multi_proof(leaves: Sequence[Union[str, bytes]], proof: MerkleMultiProof,
+                       root: Union[str, bytes]) -> bool:
+    if len(leaves) != len(proof.indices) or not proof.indices:
+        return False
+    if len(set(proof.indices)) != len(proof.indices):
+        return False
+    if not all(0 <= index < proof.leaf_count for index in proof.indices):
+        return False
+
+    hashes = iter(proof.hashes)
+    computed = _walk_multi_proof(proof.indices, proof.leaf_count,
+                                 [_as_leaf_hash(leaf) for leaf in leaves],
+                                 lambda level_idx, index: next(hashes, None))
+    return computed is not None and next(hashes, None) is None and computed == _as_root_hash(root)
+
+def _hash_leaf_chunk(chunk: List[str]) -> bytearray:
+    leaves = bytearray()
+    for tx in chunk:
+        leaves += hash_data(tx)
+    return leaves
+
+def _hash_pairs(nodes) -> bytearray:
+    # Adjacent 32-byte slots are already concatenated in the buffer, so each
+    # pair hashes straight from a 64-byte slice
+    view = memoryview(nodes)
+    sha256 = hashlib.sha256
+    parents = bytearray()
+    for offset in range(0, len(view), 2 * HASH_SIZE):
+        parents += sha256(view[offset:offset + 2 * HASH_SIZE]).digest()
+    return parents
+
+def _chunked(iterable: Iterable, size: int):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _read_lines(path: str) -> Iterable[str]:
+    # One transaction per line; blank lines are skipped
+    with open(path, encoding="utf-8") as f:
+        for raw in f:
+            line = raw.rstrip("\r\n")
+            if line:
+                yield line
+
+def _map_bounded(executor, fn, chunks, max_pending: int):
+    # Like executor.map, but only max_pending chunks are in flight, so a
+    # streamed input is never pulled into memory all at once
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(fn, chunk))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def _hash_level(nodes: bytearray, count: int, executor=None, workers: int = 1) -> bytearray:
+    view = memoryview(nodes)
+    pairs_end = (count // 2) * 2 * HASH_SIZE
+    if executor is not None and count >= PARALLEL_LEVEL_MIN:
+        step = 2 * HASH_SIZE * LEAF_CHUNK_SIZE
+        parents = bytearray()
+        slices = (bytes(view[offset:min(offset + step, pairs_end)]) for offset in range(0, pairs_end, step))
+        for hashed in _map_bounded(executor, _hash_pairs, slices, 2 * workers):
+            parents += hashed
+    else:
+        parents = _hash_pairs(view[:pairs_end])
+    if count % 2 == 1:
+        last = bytes(view[(count - 1) * HASH_SIZE:count * HASH_SIZE])
+        parents += combine_hashes(last, last)
+    return parents
+
 class MerkleTree:
-    def __init__(self, transactions):
-        self.transactions = transactions
-        self.transaction_hashes = []
-        self.levels = []
+    def __init__(self, transactions: Iterable[str], workers: int = 1):
+        # Sequences are kept as before, copied so append() and update()
+        # never modify the caller's list (or fail on a tuple); other
+        # iterables (generators, files) are streamed and only their leaf
+        # hashes are retained
+        self.transactions = list(transactions) if isinstance(transactions, SequenceABC) else None
+        self.workers = workers
+        self._levels = []
+        self._mmap = None
         self.root = None
-        self.build_tree()
+        self.build_tree(transactions)
+
+    @classmethod
+    def from_file(cls, path: str, workers: int = 1) -> "MerkleTree":
+        return cls(_read_lines(path), workers=workers)
     
-    def build_tree(self):
-        # Hash all transactions
-        self.transaction_hashes = [hash_data(tx) for tx in self.transactions]
-        
-        # Build levels bottom-up
-        current_level = self.transaction_hashes.copy()
-        self.levels = [current_level]
-        
-        # If odd number of transactions, duplicate the last one
-        if len(current_level) % 2 == 1:
-            current_level.append(current_level[-1])
+    def build_tree(self, transactions: Iterable[str] = None):
+        # With no argument the kept transactions are rebuilt; trees built
+        # from a stream or opened from a file keep none, so they need the
+        # transactions passed in again
+        if transactions is None:
+            if self.transactions is None:
+                raise ValueError("This tree keeps no transactions to rebuild from; pass them to build_tree()")
+            transactions = self.transactions
+
+        # Seconds spent per build phase, for callers that record metrics
+        self.build_timings = {}
+        phase_start = time.perf_counter()
+
+        # Hash all transactions into one packed buffer
+        chunks = _chunked(transactions, LEAF_CHUNK_SIZE)
+        leaves = bytearray()
+        if self.workers > 1:
+            first = next(chunks, [])
+            average_size = sum(len(tx) for tx in first) / max(len(first), 1)
+            pool = ThreadPoolExecutor if average_size >= THREAD_PAYLOAD_MIN else ProcessPoolExecutor
+            with pool(self.workers) as executor:
+                for hashed in _map_bounded(executor, _hash_leaf_chunk, chain([first], chunks), 2 * self.workers):
+                    leaves += hashed
+        else:
+            for chunk in chunks:
+                leaves += _hash_leaf_chunk(chunk)
+
+        if not leaves:
+            raise ValueError("A Merkle tree needs at least one transaction")
+        self._levels = [leaves]
+        self.build_timings["leaves"] = time.perf_counter() - phase_start
+        phase_start = time.perf_counter()
         
-        # Build tree from bottom up
-        while len(current_level) > 1:
-            next_level = []
-            for i in range(0, len(current_level), 2):
-                combined = combine_hashes(current_level[i], current_level[i+1])
-                next_level.append(combined)
-            
-            if len(next_level) % 2 == 1 and len(next_level) > 1:
-                next_level.append(next_level[-1])
-                
-            self.levels.append(next_level)
-            current_level = next_level
+        # Build tree from bottom up, pairing an odd last node with itself.
+        # Interior hashing is pure CPU on small inputs, so large levels are
+        # split across processes rather than threads.
+        count = len(leaves) // HASH_SIZE
+        executor = None
+        if self.workers > 1 and count >= PARALLEL_LEVEL_MIN:
+            executor = ProcessPoolExecutor(self.workers)
+        try:
+            while count + _is_padded(len(self._levels) - 1, count) > 1:
+                self._levels.append(_hash_level(self._levels[-1], count, executor, self.workers))
+                count = (count + 1) // 2
+        finally:
+            if executor is not None:
+                executor.shutdown()
         
-        self.root = self.levels[-1][0]
+        self.root = bytes(self._levels[-1][:HASH_SIZE])
+        self.build_timings["levels"] = time.perf_counter() - phase_start
+
+    def save(self, path: str):
+        counts = _level_counts(self.leaf_count)
+        offset = FILE_HEADER.size + FILE_LEVEL_ENTRY.size * len(counts)
+        with open(path, "wb") as f:
+            f.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, self.leaf_count, len(counts)))
+            for count in counts:
+                f.write(FILE_LEVEL_ENTRY.pack(offset, count))
+                offset += count * HASH_SIZE
+            for nodes in self._levels:
+                f.write(nodes)
+
+    @classmethod
+    def open(cls, path: str) -> "MerkleTree":
+        # Levels become views into a read-only memory map, so only the pages
+        # touched by root, proof and node lookups are ever read from disk
+        with open(path, "rb") as f:
+            header = f.read(FILE_HEADER.size)
+            if len(header) < FILE_HEADER.size:
+                raise ValueError(f"{path} is too short to be a Merkle tree file")
+            magic, version, leaf_count, level_count = FILE_HEADER.unpack(header)
+            if magic != FILE_MAGIC:
+                raise ValueError(f"{path} is not a Merkle tree file")
+            if version != FILE_VERSION:
+                raise ValueError(f"Unsupported Merkle tree file version {version}")
+            if leaf_count < 1 or level_count != len(_level_counts(leaf_count)):
+                raise ValueError(f"{path} has an inconsistent header")
+            table = f.read(FILE_LEVEL_ENTRY.size * level_count)
+            if len(table) < FILE_LEVEL_ENTRY.size * level_count:
+                raise ValueError(f"{path} is truncated inside its level table")
+            entries = list(FILE_LEVEL_ENTRY.iter_unpack(table))
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        view = memoryview(mapped)
+        levels = []
+        for (offset, count), expected in zip(entries, _level_counts(leaf_count)):
+            if count != expected or offset + count * HASH_SIZE > len(view):
+                for nodes in levels:
+                    nodes.release()
+                view.release()
+                mapped.close()
+                raise ValueError(f"{path} is truncated or has inconsistent level offsets")
+            levels.append(view[offset:offset + count * HASH_SIZE])
+
+        tree = cls.__new__(cls)
+        tree.transactions = None
+        tree.workers = 1
+        tree._levels = levels
+        tree._mmap = mapped
+        tree.root = bytes(levels[-1][:HASH_SIZE])
+        return tree
+
+    def close(self):
+        if self._mmap is not None:
+            for nodes in self._levels:
+                nodes.release()
+            self._levels = []
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def levels(self):
+        views = []
+        for level_idx, nodes in enumerate(self._levels):
+            count = len(nodes) // HASH_SIZE
+            views.append(HashLevel(nodes, count, _is_padded(level_idx, count)))
+        return views
+
+    @property
+    def transaction_hashes(self):
+        return HashLevel(self._levels[0], len(self._levels[0]) // HASH_SIZE, False)
+
+    @property
+    def nbytes(self):
+        return sum(len(nodes) for nodes in self._levels)
+
+    @property
+    def leaf_count(self):
+        return len(self._levels[0]) // HASH_SIZE
+
+    def _node(self, level_idx, index):
+        return bytes(self._levels[level_idx][index * HASH_SIZE:(index + 1) * HASH_SIZE])
+
+    def _check_writable(self):
+        if self._mmap is not None:
+            raise ValueError("A Merkle tree opened from a file is read-only")
+
+    def append(self, tx):
+        self._check_writable()
+        if self.transactions is not None:
+            self.transactions.append(tx)
+        self._levels[0] += hash_data(tx)
+        self._recompute_path(self.leaf_count - 1)
+
+    def update(self, index: int, tx):
+        self._check_writable()
+        if not 0 <= index < self.leaf_count:
+            raise IndexError(f"Leaf index {index} out of range")
+        if self.transactions is not None:
+            self.transactions[index] = tx
+        self._levels[0][index * HASH_SIZE:(index + 1) * HASH_SIZE] = hash_data(tx)
+        self._recompute_path(index)
+
+    def _recompute_path(self, index):
+        # Only the ancestors of the changed leaf differ. When a level's node
+        # count changes parity, the node that lost or gained its duplicate
+        # pairing is the changed node's sibling, so it is covered too.
+        counts = _level_counts(self.leaf_count)
+        while len(self._levels) < len(counts):
+            self._levels.append(bytearray())
+
+        position = index
+        for level_idx, count in enumerate(counts[:-1]):
+            left = position & ~1
+            left_hash = self._node(level_idx, left)
+            right_hash = self._node(level_idx, left + 1) if left + 1 < count else left_hash
+
+            parents = self._levels[level_idx + 1]
+            position //= 2
+            if position * HASH_SIZE == len(parents):
+                parents += combine_hashes(left_hash, right_hash)
+            else:
+                parents[position * HASH_SIZE:(position + 1) * HASH_SIZE] = combine_hashes(left_hash, right_hash)
+
+        self.root = self._node(len(counts) - 1, 0)
+
+    def get_proof(self, index: int) -> MerkleProof:
+        if not 0 <= index < self.leaf_count:
+            raise IndexError(f"Leaf index {index} out of range")
+
+        siblings = []
+        position = index
+        for level_idx, count in enumerate(_level_counts(self.leaf_count)[:-1]):
+            if not (position == count - 1 and count % 2 == 1):
+                siblings.append(self._node(level_idx, position ^ 1))
+            position //= 2
+        return MerkleProof(index, self.leaf_count, siblings)
+
+    def get_multi_proof(self, indices: Sequence[int]) -> MerkleMultiProof:
+        # Siblings shared by several proven leaves appear only once
+        indices = sorted(set(indices))
+        if not indices:
+            raise ValueError("A multi-proof needs at least one leaf index")
+        for index in indices:
+            if not 0 <= index < self.leaf_count:
+                raise IndexError(f"Leaf index {index} out of range")
+
+        hashes = []
+        def sibling_for(level_idx, index):
+            hashes.append(self._node(level_idx, index))
+            return hashes[-1]
+
+        _walk_multi_proof(indices, self.leaf_count,
+                          [self._node(0, index) for index in indices], sibling_for)
+        return MerkleMultiProof(indices, self.leaf_count, hashes)
     
     def get_root(self):
         return self.root.hex()
     
-    def visualize(self):
+    def visualize(self, max_nodes: int = VISUALIZE_MAX_NODES):
+        # Large trees are cut to the first max_nodes entries of each level
+        # and of the transaction table, with a count of what was left out
         console = Console()
         
         # Create a tree to display transactions and their hashes
@@ -62,15 +475,16 @@ class MerkleTree:
             level = self.levels[level_idx]
             level_node = root_node.add(f"Level {level_idx}", style="cyan")
             
-            for i, hash_value in enumerate(level):
+            for i in range(min(len(level), max_nodes)):
+                hash_value = level[i]
                 if level_idx == 0:  # Leaf level (individual transactions)
                     tx_idx = i + 1
-                    if tx_idx <= len(self.transactions):
+                    if tx_idx <= self.leaf_count:
                         tx_text = f"T{tx_idx}"
                         level_node.add(f"📄 {tx_text}: {hash_value.hex()}", style="yellow")
                     else:
                         # This is a duplicated transaction
-                        tx_text = f"T{len(self.transactions)} (duplicate)"
+                        tx_text = f"T{self.leaf_count} (duplicate)"
                         level_node.add(f"📄 {tx_text}: {hash_value.hex()}", style="yellow")
                 else:  # Interior level (combined hashes)
                     # Find the two child hashes from the level below
@@ -80,6 +494,8 @@ class MerkleTree:
                         child1 = self.levels[level_idx-1][child_idx1].hex()
                         child2 = self.levels[level_idx-1][child_idx2].hex()
                         level_node.add(f"🔷 H{i*2+1}{i*2+2}: {hash_value.hex()}\n    From H{i*2+1}: {child1[:16]}...\n    and H{i*2+2}: {child2[:16]}...", style="blue")
+            if len(level) > max_nodes:
+                level_node.add(f"... {len(level) - max_nodes:,} more nodes", style="dim")
         
         # Print the tree
         console.print("\n")
@@ -90,9 +506,10 @@ class MerkleTree:
         tx_table.add_column("Transaction", style="cyan")
         tx_table.add_column("Hash", style="green")
         
-        for i, tx in enumerate(self.transactions):
-            tx_hash = self.transaction_hashes[i].hex()
-            tx_table.add_row(f"T{i+1}", tx_hash)
+        for i in range(min(self.leaf_count, max_nodes)):
+            tx_table.add_row(f"T{i+1}", self.transaction_hashes[i].hex())
+        if self.leaf_count > max_nodes:
+            tx_table.add_row("...", f"{self.leaf_count - max_nodes:,} more transactions")
         
         console.print("\n")
         console.print(tx_table)
@@ -102,7 +519,7 @@ class MerkleTree:
         info_table.add_column("Property", style="cyan")
         info_table.add_column("Value", style="green")
         
-        info_table.add_row("Number of Transactions", str(len(self.transactions)))
+        info_table.add_row("Number of Transactions", str(self.leaf_count))
         info_table.add_row("Tree Height", str(len(self.levels)))
         info_table.add_row("Root Hash", self.root.hex())
         
@@ -123,16 +540,91 @@ class MerkleTree:
             border_style="blue"
         ))
 
+def _group_root(group: List[str]):
+    return len(group), MerkleTree(group).root
+
+def batch_roots(transactions: Iterable[str], batch_size: int, workers: int = 1):
+    # Roots of consecutive groups of batch_size transactions, e.g. one per
+    # block. With several workers whole groups are spread across processes;
+    # only a few groups are held in memory at a time either way.
+    groups = _chunked(transactions, batch_size)
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as executor:
+            results = _map_bounded(executor, _group_root, groups, 2 * workers)
+            for start, (count, root) in enumerate(results):
+                yield start * batch_size, count, root
+    else:
+        for start, group in enumerate(groups):
+            count, root = _group_root(group)
+            yield start * batch_size, count, root
+
 def main():
-    num_transactions = 11
-    transactions = [f"Transaction {i}" for i in range(1, num_transactions + 1)]
-    
-    tree = MerkleTree(transactions)
-    
+    parser = argparse.ArgumentParser(description='Build Merkle trees and print their roots')
+    parser.add_argument('--file', type=str, default=None,
+                      help='Newline-delimited transactions to read, streamed (default: synthetic transactions)')
+    parser.add_argument('--transactions', type=int, default=11,
+                      help='Synthetic transactions to build from when no --file is given (default: 11)')
+    parser.add_argument('--batch-size', type=int, default=None,
+                      help='Compute one root per this many transactions instead of a single root')
+    parser.add_argument('--output', type=str, default=None,
+                      help='With --batch-size, write each root as a JSON line to this file')
+    parser.add_argument('--workers', type=int, default=1,
+                      help='Processes to hash with (default: 1)')
+    parser.add_argument('--visualize', action='store_true',
+                      help='Draw the tree; large trees are cut to --max-nodes per level')
+    parser.add_argument('--max-nodes', type=int, default=VISUALIZE_MAX_NODES,
+                      help=f'Nodes drawn per level with --visualize (default: {VISUALIZE_MAX_NODES})')
+
+    args = parser.parse_args()
+
+    if args.file:
+        transactions = _read_lines(args.file)
+    else:
+        transactions = (f"Transaction {i}" for i in range(1, args.transactions + 1))
+
+    start = time.perf_counter()
+    if args.batch_size:
+        output = open(args.output, "w", encoding="utf-8") if args.output else None
+        batches = leaves = 0
+        try:
+            for first, count, root in batch_roots(transactions, args.batch_size, args.workers):
+                if output is not None:
+                    output.write(json.dumps({"start": first, "count": count, "root": root.hex()}) + "\n")
+                batches += 1
+                leaves += count
+                last_root = root
+        finally:
+            if output is not None:
+                output.close()
+        if not batches:
+            raise SystemExit("No transactions to build from")
+        elapsed = time.perf_counter() - start
+        print(f"Batches: {batches:,} of up to {args.batch_size:,} transactions")
+        print(f"Transactions: {leaves:,}")
+        print(f"Last root: {last_root.hex()}")
+        print(f"Time taken: {elapsed:.2f} seconds ({leaves / elapsed:,.0f} transactions/s)")
+        if args.output:
+            print(f"Roots written to {args.output}")
+        return
+
+    try:
+        tree = MerkleTree(transactions, workers=args.workers)
+    except ValueError:
+        # The input is streamed, so emptiness shows up only as an empty tree
+        raise SystemExit("No transactions to build from") from None
+    elapsed = time.perf_counter() - start
     print(f"Merkle Root: {tree.get_root()}")
+    print(f"Number of transactions: {tree.leaf_count:,}")
     print(f"Number of levels: {len(tree.levels)}")
-    
-    tree.visualize()
+    print(f"Time taken: {elapsed:.2f} seconds ({tree.leaf_count / elapsed:,.0f} transactions/s)")
+    print(f"Tree size: {tree.nbytes / 1024:,.1f} KB")
+
+    if args.visualize:
+        tree.visualize(args.max_nodes)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
+
+# python merkle_tree.py --visualize
+# python merkle_tree.py --file transactions.txt --workers 4
+# python merkle_tree.py --file transactions.txt --batch-size 1000 --output roots.jsonl
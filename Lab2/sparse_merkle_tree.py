@@ -0,0 +1,125 @@
+from typing import Dict, List, NamedTuple, Optional, Union
+from merkle_tree import HASH_SIZE, hash_data, combine_hashes
+
+# Keys are 256-bit hashes, so every leaf sits 256 levels below the root
+DEPTH = 256
+EMPTY_LEAF = bytes(HASH_SIZE)
+
+def _default_hashes():
+    # DEFAULT_HASHES[d] is the root of an all-empty subtree whose top is at
+    # depth d (0 = tree root, DEPTH = leaf)
+    defaults = [EMPTY_LEAF] * (DEPTH + 1)
+    for depth in range(DEPTH - 1, -1, -1):
+        defaults[depth] = combine_hashes(defaults[depth + 1], defaults[depth + 1])
+    return defaults
+
+DEFAULT_HASHES = _default_hashes()
+
+def key_for(address: str) -> int:
+    return int.from_bytes(hash_data(address), "big")
+
+class SparseMerkleProof(NamedTuple):
+    key: int
+    # Bit d set when the sibling at depth d + 1 differs from the empty
+    # default; only those siblings are listed, top-down
+    bitmap: int
+    siblings: List[bytes]
+
+class SparseMerkleTree:
+    """Merkle tree over a 256-bit key space where absent keys are empty.
+
+    Only nodes that differ from the empty-subtree default are stored, keyed
+    by (depth, index) where index is the key's top `depth` bits.
+    """
+
+    def __init__(self):
+        self._nodes: Dict[tuple, bytes] = {}
+        self.root = DEFAULT_HASHES[0]
+
+    def __len__(self):
+        return sum(1 for depth, _ in self._nodes if depth == DEPTH)
+
+    def _node(self, depth: int, index: int) -> bytes:
+        return self._nodes.get((depth, index), DEFAULT_HASHES[depth])
+
+    def _set_node(self, depth: int, index: int, value: bytes):
+        if value == DEFAULT_HASHES[depth]:
+            self._nodes.pop((depth, index), None)
+        else:
+            self._nodes[(depth, index)] = value
+
+    def get(self, key: int) -> Optional[bytes]:
+        return self._nodes.get((DEPTH, key))
+
+    def update(self, key: int, value: Optional[bytes]):
+        self.update_batch({key: value})
+
+    def update_batch(self, items: Dict[int, Optional[bytes]]):
+        # Write all leaves first, then rehash level by level. Ancestors shared
+        # by several touched keys are recomputed once per batch.
+        dirty = set()
+        for key, value in items.items():
+            self._set_node(DEPTH, key, EMPTY_LEAF if value is None else value)
+            dirty.add(key)
+
+        for depth in range(DEPTH, 0, -1):
+            parents = set()
+            for index in dirty:
+                parent = index >> 1
+                if parent in parents:
+                    continue
+                left = self._node(depth, parent << 1)
+                right = self._node(depth, (parent << 1) | 1)
+                self._set_node(depth - 1, parent, combine_hashes(left, right))
+                parents.add(parent)
+            dirty = parents
+
+        self.root = self._node(0, 0)
+
+    def copy(self) -> "SparseMerkleTree":
+        tree = SparseMerkleTree()
+        tree._nodes = dict(self._nodes)
+        tree.root = self.root
+        return tree
+
+    def root_after(self, items: Dict[int, Optional[bytes]]) -> bytes:
+        # Root the tree would have after update_batch(items). The leaves are
+        # written and then put back; since only non-default nodes are
+        # stored, the tree ends up exactly as it was.
+        previous = {key: self.get(key) for key in items}
+        self.update_batch(items)
+        root = self.root
+        self.update_batch(previous)
+        return root
+
+    def get_proof(self, key: int) -> SparseMerkleProof:
+        # Also a non-membership proof when the key is absent
+        bitmap = 0
+        siblings = []
+        for depth in range(1, DEPTH + 1):
+            sibling = self._node(depth, (key >> (DEPTH - depth)) ^ 1)
+            if sibling != DEFAULT_HASHES[depth]:
+                bitmap |= 1 << (depth - 1)
+                siblings.append(sibling)
+        return SparseMerkleProof(key, bitmap, siblings)
+
+def verify_sparse_proof(key: int, value: Optional[bytes], proof: SparseMerkleProof,
+                        root: Union[str, bytes]) -> bool:
+    # value None checks that the key is absent from the tree
+    if proof.key != key or len(proof.siblings) != bin(proof.bitmap).count("1"):
+        return False
+
+    node = EMPTY_LEAF if value is None else value
+    siblings = iter(reversed(proof.siblings))
+    for depth in range(DEPTH, 0, -1):
+        if proof.bitmap >> (depth - 1) & 1:
+            sibling = next(siblings)
+        else:
+            sibling = DEFAULT_HASHES[depth]
+        if (key >> (DEPTH - depth)) & 1:
+            node = combine_hashes(sibling, node)
+        else:
+            node = combine_hashes(node, sibling)
+
+    root = bytes.fromhex(root) if isinstance(root, str) else root
+    return node == root
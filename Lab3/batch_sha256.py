@@ -0,0 +1,161 @@
+import hashlib
+import struct
+import time
+from typing import Optional, Tuple
+from difficulty import Target
+
+# NumPy is optional; without it callers fall back to the per-nonce loop
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_BATCH_SIZE = 4096
+NONCE_FORMATS = ("decimal", "uint64")
+
+_K = (
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+)
+
+_H0 = (0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19)
+
+def available() -> bool:
+    return np is not None
+
+def _rotr(x, n):
+    return (x >> np.uint32(n)) | (x << np.uint32(32 - n))
+
+def _compress(state, block_words):
+    # One SHA-256 compression applied to every lane at once. state is a list
+    # of 8 uint32 arrays and block_words a list of 16; each array holds one
+    # value per lane.
+    w = list(block_words)
+    for t in range(16, 64):
+        w15, w2 = w[t - 15], w[t - 2]
+        s0 = _rotr(w15, 7) ^ _rotr(w15, 18) ^ (w15 >> np.uint32(3))
+        s1 = _rotr(w2, 17) ^ _rotr(w2, 19) ^ (w2 >> np.uint32(10))
+        w.append(w[t - 16] + s0 + w[t - 7] + s1)
+
+    a, b, c, d, e, f, g, h = state
+    for t in range(64):
+        s1 = _rotr(e, 6) ^ _rotr(e, 11) ^ _rotr(e, 25)
+        ch = (e & f) ^ (~e & g)
+        temp1 = h + s1 + ch + _K_ARRAY[t] + w[t]
+        s0 = _rotr(a, 2) ^ _rotr(a, 13) ^ _rotr(a, 22)
+        maj = (a & b) ^ (a & c) ^ (b & c)
+        temp2 = s0 + maj
+        h, g, f, e, d, c, b, a = g, f, e, d + temp1, c, b, a, temp1 + temp2
+
+    return [x + y for x, y in zip(state, (a, b, c, d, e, f, g, h))]
+
+if np is not None:
+    _K_ARRAY = np.array(_K, dtype=np.uint32)
+
+def _padding(message_length: int) -> bytes:
+    zeros = (55 - message_length) % 64
+    return b"\x80" + b"\x00" * zeros + struct.pack(">Q", message_length * 8)
+
+class BatchHasher:
+    """SHA-256 of prefix + nonce + suffix for many nonces per call.
+
+    Full 64-byte blocks of the prefix are compressed once into a shared
+    midstate; the remaining blocks are compressed lane-parallel with one
+    NumPy uint32 lane per nonce.
+    """
+
+    def __init__(self, prefix: bytes, suffix: bytes = b"", nonce_format: str = "decimal"):
+        if np is None:
+            raise RuntimeError("NumPy is required for the batched SHA-256 backend")
+        if nonce_format not in NONCE_FORMATS:
+            raise ValueError(f"Unknown nonce format {nonce_format!r}, expected one of {NONCE_FORMATS}")
+        self.prefix = prefix
+        self.suffix = suffix
+        # "decimal" nonces are ASCII digits, "uint64" 8 big-endian bytes
+        self.nonce_format = nonce_format
+
+        shared = len(prefix) - len(prefix) % 64
+        state = [np.array([x], dtype=np.uint32) for x in _H0]
+        for offset in range(0, shared, 64):
+            words = struct.unpack(">16I", prefix[offset:offset + 64])
+            state = _compress(state, [np.array([x], dtype=np.uint32) for x in words])
+        self._midstate = state
+        self._tail_prefix = prefix[shared:]
+
+    def _digest_words(self, nonces, digit_count: int):
+        # Lay out the unshared tail of every message as rows of bytes, write
+        # each lane's nonce digits into its row, then compress block by block
+        lanes = len(nonces)
+        placeholder = b"0" if self.nonce_format == "decimal" else b"\x00"
+        tail = self._tail_prefix + placeholder * digit_count + self.suffix
+        tail += _padding(len(self.prefix) + digit_count + len(self.suffix))
+        rows = np.tile(np.frombuffer(tail, dtype=np.uint8), (lanes, 1))
+
+        offset = len(self._tail_prefix)
+        base = 10 if self.nonce_format == "decimal" else 256
+        remaining = nonces.copy()
+        for position in range(offset + digit_count - 1, offset - 1, -1):
+            rows[:, position] += (remaining % base).astype(np.uint8)
+            remaining //= base
+
+        words = rows.view(">u4").astype(np.uint32).T
+        state = [np.broadcast_to(x, (lanes,)) for x in self._midstate]
+        for block in range(0, len(words), 16):
+            state = _compress(state, words[block:block + 16])
+        return np.stack(state)
+
+    def sweep(self, start: int, count: int, target: Target) -> Tuple[Optional[int], Optional[bytes]]:
+        # Return the first nonce in [start, start + count) meeting the target
+        stop = start + count
+        lower = target.lower >> 224
+        upper = (target.upper - 1) >> 224
+
+        while start < stop:
+            # Nonces sharing a digit count share a message layout
+            if self.nonce_format == "decimal":
+                digit_count = len(str(start))
+                run_stop = min(stop, 10 ** digit_count)
+            else:
+                digit_count, run_stop = 8, stop
+            nonces = np.arange(start, run_stop, dtype=np.uint64)
+            digests = self._digest_words(nonces, digit_count)
+
+            # Filter on the first word, then confirm candidates exactly
+            first = digests[0]
+            for lane in np.flatnonzero((first >= lower) & (first <= upper)):
+                digest = digests[:, lane].astype(">u4").tobytes()
+                if target.is_met(digest):
+                    return start + int(lane), digest
+
+            start = run_stop
+
+        return None, None
+
+def compare_throughput(data: str = "Hello, Blockchain!", attempts: int = 200_000,
+                       batch_size: int = DEFAULT_BATCH_SIZE) -> Tuple[float, float]:
+    # Hashes per second of the per-nonce hashlib loop and the batched backend
+    # over the same nonces, with a target no digest can meet
+    prefix = data.encode()
+    target = Target(0, 1)
+
+    start_time = time.perf_counter()
+    base = hashlib.sha256(prefix)
+    for nonce in range(attempts):
+        state = base.copy()
+        state.update(str(nonce).encode())
+        target.is_met(state.digest())
+    scalar_rate = attempts / (time.perf_counter() - start_time)
+
+    hasher = BatchHasher(prefix)
+    start_time = time.perf_counter()
+    for start in range(0, attempts, batch_size):
+        hasher.sweep(start, min(batch_size, attempts - start), target)
+    batch_rate = attempts / (time.perf_counter() - start_time)
+
+    return scalar_rate, batch_rate
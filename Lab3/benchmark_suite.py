@@ -0,0 +1,278 @@
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+import lab2_path
+from difficulty import Target
+from serialization import Transaction
+from nonce_finder import search_nonce
+from blockchain import Block, Blockchain
+from merkle_tree import MerkleTree, combine_hashes, hash_data
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+# Each case is timed for at least MIN_TIME seconds per repeat; the fastest
+# repeat is reported, as timeit does, since slower ones measure interference
+MIN_TIME = 0.2
+REPEATS = 5
+# Slowdown relative to the baseline that counts as a regression
+DEFAULT_THRESHOLD = 0.10
+
+class Case(NamedTuple):
+    name: str
+    params: Dict
+    # Called with params to build the inputs; returns the operation to
+    # time, which returns the SHA-256 hashes it computed (0 if not counted).
+    # Module-level so it can be sent to the worker process.
+    setup: Callable[..., Callable[[], int]]
+
+    @property
+    def key(self) -> str:
+        return self.name + "".join(f"[{key}={value}]" for key, value in self.params.items())
+
+def _hash_data_case():
+    data = "x" * 64
+    def run():
+        hash_data(data)
+        return 1
+    return run
+
+def _combine_hashes_case():
+    left, right = hash_data("left"), hash_data("right")
+    def run():
+        combine_hashes(left, right)
+        return 1
+    return run
+
+def _merkle_build_case(leaves: int):
+    transactions = [f"Transaction {i}" for i in range(leaves)]
+    def run():
+        MerkleTree(transactions)
+        # One hash per leaf plus one per interior node
+        return 2 * leaves - 1
+    return run
+
+def _find_nonce_case(prefix: str):
+    target = Target.from_hex_prefix(prefix)
+    def run():
+        return search_nonce("Hello, Blockchain!", target).hashes
+    return run
+
+def _block_hash_case(transactions: int):
+    txs = [Transaction(f"0x{i:064x}", f"0x{i + 1:064x}", 1, i) for i in range(transactions)]
+    block = Block(1, txs, time.time(), "0" * 64)
+    def run():
+        block.calculate_hash()
+        return 1
+    return run
+
+def _mine_block_case(transactions: int, difficulty: float):
+    blockchain = Blockchain()
+    blockchain.difficulty = difficulty
+    accounts = [blockchain.create_account(f"0x{i + 1:064x}") for i in range(transactions)]
+    def run():
+        # Coins move around a ring, so balances never run out
+        for i, sender in enumerate(accounts):
+            blockchain.create_transaction(sender, accounts[(i + 1) % transactions], 1)
+        return blockchain.mine_pending_transactions(accounts[0]).nonce + 1
+    return run
+
+def default_cases(quick: bool = False) -> List[Case]:
+    leaf_counts = [1_000, 10_000] if quick else [1_000, 10_000, 100_000]
+    prefixes = ["0", "00", "000"] if quick else ["0", "00", "000", "0000"]
+    cases = [
+        Case("hash_data", {}, _hash_data_case),
+        Case("combine_hashes", {}, _combine_hashes_case),
+    ]
+    cases += [Case("merkle_build", {"leaves": n}, _merkle_build_case) for n in leaf_counts]
+    cases += [Case("find_nonce", {"prefix": p}, _find_nonce_case) for p in prefixes]
+    cases += [Case("block_hash", {"transactions": n}, _block_hash_case) for n in [1, 100, 1000]]
+    cases.append(Case("mine_block", {"transactions": 100, "difficulty": 3}, _mine_block_case))
+    return cases
+
+def _time_operation(run: Callable[[], int], min_time: float, repeats: int) -> Tuple[float, float]:
+    # Calibrate how many calls fill min_time, then time that many calls
+    # repeats times. Returns the best seconds per call and hashes per call.
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            run()
+        if time.perf_counter() - start >= min_time / 10 or calls >= 1 << 24:
+            break
+        calls *= 10
+    calls = max(1, int(calls * min_time / max(time.perf_counter() - start, 1e-9)))
+
+    per_call, hashes = [], 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(calls):
+            hashes += run()
+        per_call.append((time.perf_counter() - start) / calls)
+    return min(per_call), hashes / (calls * repeats)
+
+def _calibrate() -> float:
+    # Seconds for a fixed mix of interpreter work and hashing. Comparisons
+    # divide by it, so a machine that is uniformly slower than when the
+    # baseline was taken (frequency scaling, a busy host) is not flagged.
+    def reference():
+        digest = b""
+        for i in range(1000):
+            digest = hashlib.sha256(digest + str(i).encode()).digest()
+    return _time_operation(lambda: reference() or 0, MIN_TIME / 4, 3)[0]
+
+def _peak_rss_kb() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+def run_case(case: Case, min_time: float = MIN_TIME, repeats: int = REPEATS) -> Dict:
+    # Runs in a fresh worker process, so peak RSS belongs to this case only
+    with contextlib.redirect_stdout(io.StringIO()):
+        run = case.setup(**case.params)
+        calibration = _calibrate()
+        seconds, hashes = _time_operation(run, min_time, repeats)
+
+        # Memory is measured on one extra call; tracing slows it down, so
+        # it is kept out of the timed runs
+        tracemalloc.start()
+        blocks_before = sys.getallocatedblocks()
+        run()
+        retained_blocks = sys.getallocatedblocks() - blocks_before
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "name": case.name,
+        "params": case.params,
+        "ns_per_op": seconds * 1e9,
+        "calibration_ns": calibration * 1e9,
+        "ops_per_second": 1 / seconds,
+        "hashes_per_second": hashes / seconds if hashes else None,
+        "peak_rss_kb": _peak_rss_kb(),
+        "traced_peak_bytes": traced_peak,
+        "retained_blocks": retained_blocks
+    }
+
+def run_suite(cases: List[Case], min_time: float = MIN_TIME, repeats: int = REPEATS) -> Dict:
+    results = {}
+    for case in cases:
+        with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+            results[case.key] = pool.apply(run_case, (case, min_time, repeats))
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.time()
+        },
+        "results": results
+    }
+
+def change_ratio(result: Dict, previous: Dict, normalize: bool = True) -> float:
+    # Time per op relative to the baseline, corrected for machine speed
+    ratio = result["ns_per_op"] / previous["ns_per_op"]
+    if normalize and "calibration_ns" in previous:
+        ratio /= result["calibration_ns"] / previous["calibration_ns"]
+    return ratio
+
+def compare(results: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD,
+            normalize: bool = True) -> List[Tuple[str, float]]:
+    # Cases whose time per op grew by more than threshold, with the ratio
+    regressions = []
+    for key, result in results["results"].items():
+        previous = baseline["results"].get(key)
+        if previous is None:
+            continue
+        ratio = change_ratio(result, previous, normalize)
+        if ratio > 1 + threshold:
+            regressions.append((key, ratio))
+    return regressions
+
+def _format_ns(ns: float) -> str:
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("us", 1e3)):
+        if ns >= scale:
+            return f"{ns / scale:.2f} {unit}"
+    return f"{ns:.0f} ns"
+
+def _print_results(results: Dict, baseline: Optional[Dict], normalize: bool):
+    print(f"{'Benchmark':<44} {'Time/op':>10} {'Hashes/s':>12} {'Peak RSS':>10} "
+          f"{'Traced':>10} {'Retained':>8} {'vs base':>8}")
+    for key, result in results["results"].items():
+        hashes = f"{result['hashes_per_second']:,.0f}" if result["hashes_per_second"] else "-"
+        change = ""
+        if baseline and key in baseline["results"]:
+            change = f"{change_ratio(result, baseline['results'][key], normalize) - 1:+.1%}"
+        print(f"{key:<44} {_format_ns(result['ns_per_op']):>10} {hashes:>12} "
+              f"{result['peak_rss_kb'] / 1024:>8.1f}MB {result['traced_peak_bytes'] / 1024:>8.1f}KB "
+              f"{result['retained_blocks']:>8} {change:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark hashing, Merkle trees, mining and chain operations')
+    parser.add_argument('--only', type=str, nargs='+', default=None,
+                      help='Run only benchmarks whose name contains one of these strings')
+    parser.add_argument('--quick', action='store_true',
+                      help='Smaller inputs and shorter timings for a fast check')
+    parser.add_argument('--output', type=str, default="benchmark_results.json",
+                      help='Where to write the JSON results (default: benchmark_results.json)')
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE,
+                      help='Baseline results to compare against (default: benchmark_baseline.json)')
+    parser.add_argument('--save-baseline', action='store_true',
+                      help='Store these results as the new baseline')
+    parser.add_argument('--no-normalize', action='store_true',
+                      help='Compare raw times without correcting for machine speed')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                      help='Slowdown flagged as a regression, as a fraction (default: 0.10)')
+
+    args = parser.parse_args()
+
+    cases = default_cases(args.quick)
+    if args.only:
+        cases = [case for case in cases if any(name in case.key for name in args.only)]
+    min_time, repeats = (MIN_TIME / 4, 3) if args.quick else (MIN_TIME, REPEATS)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    elif not args.save_baseline:
+        sys.exit(f"No baseline at {args.baseline}; create one with --save-baseline")
+
+    results = run_suite(cases, min_time, repeats)
+    _print_results(results, baseline, not args.no_normalize)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    else:
+        missing = [key for key in results["results"] if key not in baseline["results"]]
+        for key in missing:
+            print(f"Not in the baseline, not compared: {key}")
+        regressions = compare(results, baseline, args.threshold, not args.no_normalize)
+        for key, ratio in regressions:
+            print(f"REGRESSION: {key} is {ratio - 1:.1%} slower than the baseline")
+        if regressions:
+            sys.exit(1)
+        compared = len(results["results"]) - len(missing)
+        print(f"No regressions beyond {args.threshold:.0%} in {compared} cases compared against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
+
+# python benchmark_suite.py --save-baseline
+# python benchmark_suite.py --only merkle_build find_nonce
+# python benchmark_suite.py --quick --threshold 0.2
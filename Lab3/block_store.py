@@ -0,0 +1,203 @@
+import json
+import os
+import struct
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Callable, Dict, Iterator, Optional, Tuple
+import metrics
+
+# One fixed-size entry per block: segment number, byte offset, record length
+INDEX_ENTRY = struct.Struct("<IQI")
+RECORD_HEADER = struct.Struct("<I")
+
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024
+DEFAULT_SNAPSHOT_INTERVAL = 100
+DEFAULT_CACHE_SIZE = 256
+
+class BlockStore:
+    """Append-only on-disk block log with an offset index.
+
+    Blocks are length-prefixed JSON records in numbered segment files. The
+    index file maps a block's height to its record, so any block is read
+    with two seeks and nothing is parsed at startup. State that is not part
+    of any block (new accounts, pending transactions, mined markers) goes to
+    an append-only journal, and snapshots of the derived account state let a
+    restart replay only the journal tail.
+    """
+
+    def __init__(self, path: str, block_factory: Callable[[Dict], object],
+                 segment_size: int = DEFAULT_SEGMENT_SIZE,
+                 snapshot_interval: int = DEFAULT_SNAPSHOT_INTERVAL,
+                 cache_size: int = DEFAULT_CACHE_SIZE):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.block_factory = block_factory
+        self.segment_size = segment_size
+        self.snapshot_interval = snapshot_interval
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._readers = {}
+
+        self._index = open(os.path.join(path, "blocks.idx"), "a+b")
+        self._journal = open(os.path.join(path, "journal.log"), "a+b")
+        self._recover()
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.path, f"blocks-{segment:05d}.log")
+
+    def _entry(self, height: int) -> Tuple[int, int, int]:
+        self._index.seek(height * INDEX_ENTRY.size)
+        return INDEX_ENTRY.unpack(self._index.read(INDEX_ENTRY.size))
+
+    def _recover(self):
+        # A crash can leave a partial index entry or a segment record that
+        # was never indexed; drop both so the log ends on a whole block
+        self._index.seek(0, os.SEEK_END)
+        size = self._index.tell()
+        self._count = size // INDEX_ENTRY.size
+        if size % INDEX_ENTRY.size:
+            self._index.truncate(self._count * INDEX_ENTRY.size)
+
+        if self._count:
+            segment, offset, length = self._entry(self._count - 1)
+            end = offset + RECORD_HEADER.size + length
+        else:
+            segment, end = 0, 0
+        self._segment = segment
+        self._writer = open(self._segment_path(segment), "a+b")
+        self._writer.seek(0, os.SEEK_END)
+        if self._writer.tell() > end:
+            self._writer.truncate(end)
+
+        # Likewise cut a torn final journal line back to the last newline
+        self._journal.seek(0, os.SEEK_END)
+        end = self._journal.tell()
+        while end > 0:
+            start = max(0, end - 4096)
+            self._journal.seek(start)
+            newline = self._journal.read(end - start).rfind(b"\n")
+            if newline != -1:
+                end = start + newline + 1
+                break
+            end = start
+        self._journal.truncate(end)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, block) -> int:
+        start = time.perf_counter() if metrics.enabled else 0.0
+        record = json.dumps(block.to_dict(), sort_keys=True).encode()
+        self._writer.seek(0, os.SEEK_END)
+        if self._writer.tell() and self._writer.tell() + len(record) > self.segment_size:
+            self._writer.close()
+            self._segment += 1
+            self._writer = open(self._segment_path(self._segment), "a+b")
+
+        offset = self._writer.tell()
+        self._writer.write(RECORD_HEADER.pack(len(record)) + record)
+        self._writer.flush()
+        # The index entry is written last, so it only ever points at a
+        # complete record
+        self._index.seek(0, os.SEEK_END)
+        self._index.write(INDEX_ENTRY.pack(self._segment, offset, len(record)))
+        self._index.flush()
+
+        self._count += 1
+        self._remember(self._count - 1, block)
+        if metrics.enabled:
+            metrics.STORE_APPEND_SECONDS.observe(time.perf_counter() - start)
+        return self._count - 1
+
+    def read(self, height: int):
+        if not 0 <= height < self._count:
+            raise IndexError(f"Block {height} is not in the store")
+        if height in self._cache:
+            self._cache.move_to_end(height)
+            return self._cache[height]
+
+        block = self.block_factory(self.read_record(height))
+        self._remember(height, block)
+        return block
+
+    def read_record(self, height: int) -> Dict:
+        # The stored block fields as a dict, without building a block object
+        if not 0 <= height < self._count:
+            raise IndexError(f"Block {height} is not in the store")
+
+        segment, offset, length = self._entry(height)
+        if segment == self._segment:
+            self._writer.seek(offset + RECORD_HEADER.size)
+            record = self._writer.read(length)
+            self._writer.seek(0, os.SEEK_END)
+        else:
+            reader = self._readers.get(segment)
+            if reader is None:
+                reader = self._readers[segment] = open(self._segment_path(segment), "rb")
+            reader.seek(offset + RECORD_HEADER.size)
+            record = reader.read(length)
+        return json.loads(record)
+
+    def _remember(self, height: int, block):
+        self._cache[height] = block
+        self._cache.move_to_end(height)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def log_event(self, event: Dict):
+        self._journal.seek(0, os.SEEK_END)
+        self._journal.write(json.dumps(event, sort_keys=True).encode() + b"\n")
+        self._journal.flush()
+
+    def journal_offset(self) -> int:
+        self._journal.seek(0, os.SEEK_END)
+        return self._journal.tell()
+
+    def read_events(self, offset: int = 0) -> Iterator[Dict]:
+        self._journal.seek(offset)
+        for line in self._journal:
+            yield json.loads(line)
+
+    def _snapshot_path(self) -> str:
+        return os.path.join(self.path, "snapshot.json")
+
+    def write_snapshot(self, state: Dict):
+        # Written to a temporary file and renamed, so a crash keeps the
+        # previous snapshot intact
+        temporary = self._snapshot_path() + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(temporary, self._snapshot_path())
+
+    def load_snapshot(self) -> Optional[Dict]:
+        try:
+            with open(self._snapshot_path(), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def close(self):
+        for handle in [self._index, self._journal, self._writer, *self._readers.values()]:
+            handle.close()
+        self._readers = {}
+        self._cache.clear()
+
+class StoredChain(Sequence):
+    """List-like view of a BlockStore that loads blocks on access."""
+
+    def __init__(self, store: BlockStore):
+        self.store = store
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.store.read(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return self.store.read(index)
+
+    def append(self, block):
+        self.store.append(block)
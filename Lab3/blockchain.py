@@ -1,14 +1,32 @@
+import argparse
 import hashlib
 import json
 import time
 import random
-from typing import List, Dict
+from typing import Callable, List, Dict, Iterable, Optional, Sequence
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
 from rich.prompt import Prompt, Confirm
-from rich.progress import Progress
 from rich import box
+from hashing import BinaryNonceCounter, MidstateHasher, NonceCounter
+from difficulty import Target
+import batch_sha256
+import metrics
+import mining
+from mining import ProgressCallback, RichProgress
+from chain_index import ChainIndex, transaction_id
+from block_store import BlockStore, StoredChain
+from mempool import Mempool
+from retarget import Retargeter
+from validation import ValidationReport, validate_records
+from serialization import (BLOCK_VERSION, COINBASE_ADDRESS, LEGACY_BLOCK_VERSION, NONCE_OFFSET, Transaction,
+                           canonical_address, encode_block, encode_header, transactions_root)
+
+# The account state tree is built on the Lab2 Merkle primitives
+import lab2_path
+from merkle_tree import hash_data
+from sparse_merkle_tree import SparseMerkleProof, SparseMerkleTree, key_for, verify_sparse_proof
 
 console = Console()
 
@@ -16,11 +34,16 @@ console = Console()
 WEI_PER_ETHER = 10**18
 GWEI_PER_ETHER = 10**9
 
+# Coins every new account starts with
+STARTING_BALANCE = 100
+
 class Account:
     def __init__(self, address: str):
         self.address = address
-        self.balance = 100
+        self.balance = STARTING_BALANCE
         self.transaction_count = 0
+        # Transactions in the chain that send to or from this account
+        self.confirmed_transactions = 0
         self.created_at = time.time()
         self.last_active = time.time()
         
@@ -30,20 +53,93 @@ class Account:
     def add_transaction(self):
         self.transaction_count += 1
         self.update_activity()
+    
+    def state_hash(self) -> Optional[bytes]:
+        # An account no block has touched exists only on this node, so it
+        # stays out of the state tree and every node computes the same root
+        if not self.confirmed_transactions:
+            return None
+        return account_state_hash(self.address, self.balance)
+
+def account_state_hash(address: str, balance: int) -> bytes:
+    # Leaf committed to by the state root for one account
+    return hash_data(f"{address}:{balance}")
+
+def verify_account_proof(address: str, balance: Optional[int], proof: SparseMerkleProof, state_root: str) -> bool:
+    # balance None checks that the account does not exist in that state
+    value = None if balance is None else account_state_hash(address, balance)
+    return verify_sparse_proof(key_for(address), value, proof, state_root)
 
 class Block:
-    def __init__(self, index: int, transactions: List[Dict], timestamp: float, previous_hash: str):
+    def __init__(self, index: int, transactions: List[Transaction], timestamp: float, previous_hash: str,
+                 version: int = BLOCK_VERSION):
+        self.version = version
         self.index = index
         self.timestamp = timestamp
         self.transactions = transactions
         self.previous_hash = previous_hash
         self.nonce = 0
-        self.hash = self.calculate_hash()
+        # Version 2 headers commit to the transactions through this root
+        self.merkle_root = transactions_root(transactions) if version >= BLOCK_VERSION else None
         self.miner = ""
+        # Version 2 headers also commit to the difficulty and state root,
+        # so both must be set before the nonce is searched
         self.difficulty = 0
-        self.size = len(str(transactions))
+        # Root of the account state tree after this block's transactions
+        self.state_root = ""
+        self.hash = self.calculate_hash()
+        if version >= BLOCK_VERSION:
+            self.size = len(self.encode())
+        else:
+            self.size = len(str(transactions))
+
+    def to_dict(self) -> Dict:
+        transactions = self.transactions
+        if self.version >= BLOCK_VERSION:
+            transactions = [tx.to_dict() for tx in transactions]
+        return {
+            "version": self.version,
+            "index": self.index,
+            "timestamp": self.timestamp,
+            "transactions": transactions,
+            "previous_hash": self.previous_hash,
+            "nonce": self.nonce,
+            "hash": self.hash,
+            "miner": self.miner,
+            "difficulty": self.difficulty,
+            "state_root": self.state_root
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Block":
+        # Blocks stored before versioning are legacy JSON-hashed blocks
+        version = data.get("version", LEGACY_BLOCK_VERSION)
+        transactions = data["transactions"]
+        if version >= BLOCK_VERSION:
+            transactions = [Transaction.from_dict(tx) for tx in transactions]
+        block = cls(data["index"], transactions, data["timestamp"], data["previous_hash"], version)
+        block.nonce = data["nonce"]
+        block.hash = data["hash"]
+        block.miner = data["miner"]
+        block.difficulty = data["difficulty"]
+        block.state_root = data["state_root"]
+        return block
+
+    def header(self) -> bytes:
+        return encode_header(self.version, self.index, self.timestamp, self.previous_hash,
+                             self.merkle_root, self.state_root, self.difficulty, self.nonce)
+
+    def encode(self) -> bytes:
+        if not metrics.enabled:
+            return encode_block(self.header(), self.transactions)
+        start = time.perf_counter()
+        encoded = encode_block(self.header(), self.transactions)
+        metrics.BLOCK_SERIALIZATION_SECONDS.observe(time.perf_counter() - start)
+        return encoded
 
     def calculate_hash(self) -> str:
+        if self.version >= BLOCK_VERSION:
+            return hashlib.sha256(self.header()).hexdigest()
         block_string = json.dumps({
             "index": self.index,
             "timestamp": self.timestamp,
@@ -52,32 +148,94 @@ class Block:
             "nonce": self.nonce
         }, sort_keys=True).encode()
         return hashlib.sha256(block_string).hexdigest()
+
+    def _hash_parts(self):
+        if self.version >= BLOCK_VERSION:
+            # The nonce closes the fixed-size header
+            return self.header()[:NONCE_OFFSET], b""
+        # json.dumps(sort_keys=True) places "nonce" between "index" and
+        # "previous_hash", so serialize the fields around it once and only
+        # feed the nonce digits per attempt. Digests match calculate_hash().
+        head = json.dumps({"index": self.index}, sort_keys=True)[:-1] + ', "nonce": '
+        tail = ", " + json.dumps({
+            "timestamp": self.timestamp,
+            "transactions": self.transactions,
+            "previous_hash": self.previous_hash
+        }, sort_keys=True)[1:]
+        return head.encode(), tail.encode()
+
+    def nonce_counter(self):
+        if self.version >= BLOCK_VERSION:
+            return BinaryNonceCounter(self.nonce)
+        return NonceCounter(self.nonce)
+
+    def hasher(self) -> MidstateHasher:
+        return MidstateHasher(*self._hash_parts())
+
+    def batch_hasher(self) -> "batch_sha256.BatchHasher":
+        nonce_format = "uint64" if self.version >= BLOCK_VERSION else "decimal"
+        return batch_sha256.BatchHasher(*self._hash_parts(), nonce_format=nonce_format)
         
     def __str__(self) -> str:
         return f"Block #{self.index} | Hash: {self.hash} | TXs: {len(self.transactions)}"
 
 class Blockchain:
-    def __init__(self):
-        self.chain = []
-        self.pending_transactions = []
+    def __init__(self, data_dir: Optional[str] = None, genesis_timestamp: Optional[float] = None):
+        # With a data_dir the chain lives in an on-disk BlockStore and is
+        # reloaded from its latest snapshot on startup
+        self.store = BlockStore(data_dir, Block.from_dict) if data_dir else None
+        self.chain = StoredChain(self.store) if self.store is not None else []
+        self.mempool = Mempool()
         self.accounts = {}
+        self.index = ChainIndex()
+        self.state_tree = SparseMerkleTree()
+        # Accounts whose state changed since the last committed state root
+        self._dirty_accounts = set()
+        # Leading zero hex digits; fractional values step in bits (0.25 = 1 bit)
         self.difficulty = 4
+        # With a Retargeter each block's difficulty follows recent block
+        # times and self.difficulty follows the latest block; without one
+        # blocks must meet at least self.difficulty
+        self.retargeter: Optional[Retargeter] = None
+        # "batch" hashes NumPy batches of nonces when NumPy is installed
+        self.mining_backend = "scalar"
         self.mining_reward = 100
+        # Upper bound on transactions per block, coinbase included
+        self.max_block_transactions = 1000
         self.total_coins = 0
         self.blocks_mined = 0
         self.current_account = None
-        self.create_genesis_block()
+        # (height, last block hash, replayed balances, replayed state tree)
+        # after the last clean validate_chain() run
+        self._validation_checkpoint = None
+        if self.store is not None and len(self.store):
+            self._restore()
+        else:
+            self.create_genesis_block(genesis_timestamp)
     
-    def create_genesis_block(self):
-        genesis = Block(0, [], time.time(), "0" * 64)
+    def create_genesis_block(self, timestamp: Optional[float] = None):
+        # Nodes that share a network must agree on the genesis timestamp
+        genesis = Block(0, [], time.time() if timestamp is None else timestamp, "0" * 64)
+        genesis.miner = COINBASE_ADDRESS
+        genesis.state_root = self.state_tree.root.hex()
         genesis.hash = genesis.calculate_hash()
-        genesis.miner = "0x0000000000000000000000000000000000000000"
         self.chain.append(genesis)
+        self.index.add_block(genesis)
     
-    def create_account(self) -> str:
-        address = f"0x{hashlib.sha256(str(time.time()).encode()).hexdigest()}"
+    def create_account(self, address: Optional[str] = None) -> str:
+        # An address may be given to register an account known to other nodes
+        if address is None:
+            address = f"0x{hashlib.sha256(str(time.time()).encode()).hexdigest()}"
+        address = canonical_address(address)
+        # canonical_address spells every all-zero address as the coinbase.
+        # Mining rewards come from it, so it never holds a balance.
+        if address == COINBASE_ADDRESS:
+            raise ValueError("The coinbase address cannot be registered as an account")
+        if address in self.accounts:
+            return address
         self.accounts[address] = Account(address)
-        self.total_coins += 100
+        self.total_coins += STARTING_BALANCE
+        self._log_event({"type": "account", "address": address, "created_at": self.accounts[address].created_at})
         return address
     
     def switch_account(self, address: str) -> bool:
@@ -105,73 +263,460 @@ class Blockchain:
             "last_active": time.ctime(account.last_active)
         }
     
+    @property
+    def pending_transactions(self) -> List[Transaction]:
+        return list(self.mempool)
+    
+    def _admit(self, tx: Transaction) -> bool:
+        # Spends are checked against the confirmed balance minus whatever the
+        # sender already has waiting in the mempool
+        if tx.sender not in self.accounts or tx.recipient not in self.accounts:
+            return False
+        if tx.amount <= 0 or not self.mempool.add(tx, self.accounts[tx.sender].balance):
+            return False
+        self.accounts[tx.sender].add_transaction()
+        return True
+    
     def create_transaction(self, sender: str, recipient: str, amount: int) -> bool:
-        if sender not in self.accounts or recipient not in self.accounts:
+        try:
+            tx = Transaction(sender, recipient, amount)
+        except ValueError:
+            # A malformed address can belong to no account
             return False
-            
-        if self.get_balance(sender) < amount:
+        if not self._admit(tx):
             return False
-            
-        self.pending_transactions.append({
-            "sender": sender,
-            "recipient": recipient,
-            "amount": amount,
-            "timestamp": time.time()
-        })
-        
-        self.accounts[sender].add_transaction()
+        self._log_event({"type": "transaction", "tx": tx.to_dict()})
         return True
     
-    def mine_pending_transactions(self, miner_address: str):
+    def submit_batch(self, transactions: Iterable[Transaction]) -> List[bool]:
+        # Admit many transactions at once; the accepted ones share a single
+        # journal write
+        transactions = list(transactions)
+        results = [self._admit(tx) for tx in transactions]
+        if self.store is not None:
+            accepted = [tx.to_dict() for tx, ok in zip(transactions, results) if ok]
+            if accepted:
+                self._log_event({"type": "transactions", "txs": accepted})
+        return results
+    
+    def prepare_block(self, miner_address: str) -> Optional[Block]:
+        # Draws the next block's transactions from the mempool. The caller
+        # finds its nonce and hands it to commit_block(), or returns the
+        # transactions with abandon_block() if another block won the race.
         if miner_address not in self.accounts:
             return None
             
-        self.pending_transactions.append({
-            "sender": "0x0000000000000000000000000000000000000000",
-            "recipient": miner_address,
-            "amount": self.mining_reward,
-            "timestamp": time.time()
-        })
+        # A transaction can stop being affordable after it was admitted, when
+        # a block from another node confirms other spends by its sender.
+        # Those are dropped for good, and the journal records it.
+        transactions = []
+        dropped = []
+        spent = {}
+        for tx in self.mempool.take(self.max_block_transactions - 1):
+            total = spent.get(tx.sender, 0) + tx.amount
+            if total <= self.accounts[tx.sender].balance:
+                spent[tx.sender] = total
+                transactions.append(tx)
+            else:
+                dropped.append(tx)
+        if dropped:
+            self.mempool.remove(dropped)
+            self._log_event({"type": "dropped", "txids": [tx.txid() for tx in dropped]})
+        transactions.append(Transaction(COINBASE_ADDRESS, miner_address, self.mining_reward))
         
         block = Block(
             len(self.chain),
-            self.pending_transactions,
+            transactions,
             time.time(),
             self.chain[-1].hash
         )
         
         block.miner = miner_address
-        block.difficulty = self.difficulty
+        block.difficulty = self.difficulty = self.expected_difficulty(block.index)
+        # The header commits to the state after the block, so it is worked
+        # out before mining without touching the live state tree
+        block.state_root = self._state_root_after(transactions)
+        return block
+    
+    def mine_pending_transactions(self, miner_address: str, progress: Optional[ProgressCallback] = None):
+        # Headless unless a progress callback (e.g. RichProgress) is given
+        block = self.prepare_block(miner_address)
+        if block is None:
+            return None
         
-        with Progress() as progress:
-            task = progress.add_task("[cyan]Mining block...", total=None)
-            while block.hash[:self.difficulty] != "0" * self.difficulty:
-                block.nonce += 1
-                block.hash = block.calculate_hash()
-                progress.update(task, advance=1)
+        target = Target.from_difficulty(self.difficulty)
+        result = mining.mine(block, target, self.mining_backend, progress)
         
+        block.nonce = result.nonce
+        block.hash = result.digest.hex()
+        self.commit_block(block)
+        return block
+    
+    def commit_block(self, block: Block):
+        # Balances are applied first and must produce the block's state root;
+        # otherwise they are undone and ValueError is raised
+        self._apply_block(block)
         self.chain.append(block)
+        self.index.add_block(block)
         self.blocks_mined += 1
+        # Releases the spends the block's transactions held in the mempool
+        self.mempool.remove(block.transactions)
+        
+        self._log_event({"type": "block", "height": block.index})
+        if self.store is not None and len(self.chain) % self.store.snapshot_interval == 0:
+            self._write_snapshot()
+    
+    def abandon_block(self, block: Block):
+        # Transactions of a block that was never committed go back to the
+        # front of the mempool, except those a newer block already confirmed
+        self.mempool.requeue(
+            tx for tx in block.transactions
+            if tx.sender != COINBASE_ADDRESS and self.index.find_transaction(tx.txid()) is None
+        )
+    
+    def receive_block(self, block: Block) -> bool:
+        # Accepts a block mined elsewhere if it extends the current tip with
+        # a valid hash, difficulty, proof of work, coinbase and balances
+        if block.version < BLOCK_VERSION:
+            return False
+        if block.index != len(self.chain) or block.previous_hash != self.chain[-1].hash:
+            return False
         
-        for tx in self.pending_transactions:
-            if tx["sender"] != "0x0000000000000000000000000000000000000000":
+        balances = {}
+        for tx in block.transactions:
+            for address in (tx["sender"], tx["recipient"]):
+                if address in self.accounts:
+                    balances[address] = self.accounts[address].balance
+        # The difficulty must follow this chain's rule and the block must pay
+        # exactly one coinbase reward; the state root is checked on commit
+        report = validate_records([block.to_dict()], Block.from_dict, block.index, block.previous_hash,
+                                  balances, STARTING_BALANCE, COINBASE_ADDRESS, 1, self.mining_reward,
+                                  self._difficulty_rule())
+        if not report.valid:
+            return False
+        
+        try:
+            self.commit_block(block)
+        except ValueError:
+            return False
+        return True
+    
+    def expected_difficulty(self, height: int, records: Sequence[Dict] = (), start_height: int = 0) -> float:
+        # Difficulty required of the block at height, from the blocks below
+        # it; records, if given, stand in for the chain from start_height
+        # on. The genesis block is skipped: its timestamp predates mining.
+        if self.retargeter is None:
+            return self.difficulty
+        if height <= 1:
+            return self.retargeter.initial_difficulty
+        timestamps, difficulties = [], []
+        for i in range(max(1, height - 1 - self.retargeter.window), height):
+            if start_height <= i < start_height + len(records):
+                timestamps.append(records[i - start_height]["timestamp"])
+                difficulties.append(records[i - start_height]["difficulty"])
+            else:
+                timestamps.append(self.chain[i].timestamp)
+                difficulties.append(self.chain[i].difficulty)
+        return self.retargeter.next_difficulty(timestamps, difficulties)
+    
+    def _difficulty_rule(self, records: Sequence[Dict] = (), start_height: int = 0) -> Callable[[int, float], bool]:
+        # With a retargeter a block must carry exactly the retargeted
+        # difficulty; without one, at least the configured difficulty
+        if self.retargeter is None:
+            return lambda height, difficulty: difficulty >= self.difficulty
+        return lambda height, difficulty: difficulty == self.expected_difficulty(height, records, start_height)
+    
+    @staticmethod
+    def chain_work(blocks: Iterable[Block]) -> float:
+        # Expected hashes needed to produce these blocks; forks are resolved
+        # in favour of the most work, not the most blocks
+        return sum(Target.from_difficulty(block.difficulty).expected_attempts for block in blocks)
+    
+    def reorganize(self, fork_height: int, blocks: List[Block]) -> bool:
+        # Replaces the blocks from fork_height on with a competing branch if
+        # it carries more work. Transactions only in the replaced blocks
+        # return to the mempool. On-disk chains are append-only and are
+        # never reorganized.
+        if self.store is not None or not 0 < fork_height <= len(self.chain):
+            return False
+        if self.chain_work(blocks) <= self.chain_work(self.chain[fork_height:]):
+            return False
+        
+        replaced = self._rollback(fork_height)
+        for block in blocks:
+            if not self.receive_block(block):
+                self._rollback(fork_height)
+                for old_block in replaced:
+                    self.receive_block(old_block)
+                return False
+        
+        for block in replaced:
+            self.abandon_block(block)
+        return True
+    
+    def _rollback(self, height: int) -> List[Block]:
+        # Pops blocks down to height and undoes their balance changes
+        removed = []
+        while len(self.chain) > height:
+            block = self.chain.pop()
+            self.index.remove_block(block)
+            self._undo_transactions(block.transactions)
+            self.blocks_mined -= 1
+            removed.append(block)
+        self._commit_state()
+        removed.reverse()
+        return removed
+    
+    def _apply_block(self, block: Block):
+        start = time.perf_counter() if metrics.enabled else 0.0
+        created = self._apply_transactions(block.transactions)
+        self._commit_state()
+        if self.state_tree.root.hex() != block.state_root:
+            # Undoing leaves the accounts this block created with no
+            # confirmed transactions, which takes them out of the tree
+            # before they are dropped
+            self._undo_transactions(block.transactions)
+            self._commit_state()
+            for address in created:
+                del self.accounts[address]
+                self.total_coins -= STARTING_BALANCE
+            raise ValueError(f"Block {block.index}: state root does not match the replayed balances")
+        if metrics.enabled:
+            metrics.BLOCK_APPLY_SECONDS.observe(time.perf_counter() - start)
+    
+    def _apply_transactions(self, transactions: List[Dict]) -> List[str]:
+        # Returns the accounts created for addresses seen for the first time
+        created = []
+        for tx in transactions:
+            # Blocks received from other nodes may pay accounts created there
+            for address in (tx["sender"], tx["recipient"]):
+                if address not in self.accounts and address != COINBASE_ADDRESS:
+                    self.accounts[address] = Account(address)
+                    self.total_coins += STARTING_BALANCE
+                    created.append(address)
+            if tx["sender"] != COINBASE_ADDRESS:
                 self.accounts[tx["sender"]].balance -= tx["amount"]
+                self.accounts[tx["sender"]].confirmed_transactions += 1
             self.accounts[tx["recipient"]].balance += tx["amount"]
+            self.accounts[tx["recipient"]].confirmed_transactions += 1
             self.accounts[tx["recipient"]].add_transaction()
+            self._dirty_accounts.update((tx["sender"], tx["recipient"]))
+        return created
+    
+    def _undo_transactions(self, transactions: List[Transaction]):
+        for tx in reversed(transactions):
+            if tx.sender != COINBASE_ADDRESS:
+                self.accounts[tx.sender].balance += tx.amount
+                self.accounts[tx.sender].confirmed_transactions -= 1
+            self.accounts[tx.recipient].balance -= tx.amount
+            self.accounts[tx.recipient].confirmed_transactions -= 1
+            self.accounts[tx.recipient].transaction_count -= 1
+            self._dirty_accounts.update((tx.sender, tx.recipient))
+    
+    def _state_root_after(self, transactions: List[Transaction]) -> str:
+        # State root the tree would have once transactions are applied;
+        # every address they touch is then in the chain and has a leaf
+        balances = {}
+        for tx in transactions:
+            for address in (tx.sender, tx.recipient):
+                if address != COINBASE_ADDRESS and address not in balances:
+                    balances[address] = self.get_balance(address) if address in self.accounts else STARTING_BALANCE
+            if tx.sender != COINBASE_ADDRESS:
+                balances[tx.sender] -= tx.amount
+            balances[tx.recipient] += tx.amount
+        return self.state_tree.root_after({
+            key_for(address): account_state_hash(address, balance) for address, balance in balances.items()
+        }).hex()
+    
+    def _log_event(self, event: Dict):
+        if self.store is not None:
+            self.store.log_event(event)
+    
+    def _write_snapshot(self):
+        self.store.write_snapshot({
+            "height": len(self.chain),
+            "journal_offset": self.store.journal_offset(),
+            "accounts": {
+                address: [account.balance, account.transaction_count, account.created_at, account.last_active,
+                          account.confirmed_transactions]
+                for address, account in self.accounts.items()
+            },
+            "pending_transactions": [tx.to_dict() for tx in self.mempool.unconfirmed()],
+            "difficulty": self.difficulty,
+            "total_coins": self.total_coins,
+            "blocks_mined": self.blocks_mined,
+            "total_transactions": self.index.total_transactions
+        })
+    
+    def _restore(self):
+        # Start from the latest snapshot, then replay only the journal events
+        # and blocks recorded after it
+        snapshot = self.store.load_snapshot()
+        if snapshot:
+            recount = False
+            for address, (balance, transaction_count, created_at, last_active, *confirmed) in \
+                    snapshot["accounts"].items():
+                account = Account(address)
+                account.balance = balance
+                account.transaction_count = transaction_count
+                account.created_at = created_at
+                account.last_active = last_active
+                if confirmed:
+                    account.confirmed_transactions = confirmed[0]
+                else:
+                    recount = True
+                self.accounts[address] = account
+            if recount:
+                # Snapshots written before confirmed counts were kept
+                for block in self.chain[1:snapshot["height"]]:
+                    for tx in block.transactions:
+                        for address in (tx["sender"], tx["recipient"]):
+                            if address != COINBASE_ADDRESS:
+                                self.accounts[address].confirmed_transactions += 1
+            for tx in snapshot["pending_transactions"]:
+                self.mempool.add(Transaction.from_dict(tx))
+            self.difficulty = snapshot["difficulty"]
+            self.total_coins = snapshot["total_coins"]
+            self.blocks_mined = snapshot["blocks_mined"]
+            height = snapshot["height"]
+            self.index.attach(self.chain, height, snapshot["total_transactions"])
+            events = self.store.read_events(snapshot["journal_offset"])
+        else:
+            height = 1
+            self.index.add_block(self.chain[0])
+            events = self.store.read_events()
         
-        self.pending_transactions = []
-        return block
+        for event in events:
+            if event["type"] == "account":
+                self.accounts[event["address"]] = Account(event["address"])
+                self.accounts[event["address"]].created_at = event["created_at"]
+                self.total_coins += STARTING_BALANCE
+            elif event["type"] in ("transaction", "transactions"):
+                for tx in event["txs"] if "txs" in event else [event["tx"]]:
+                    self.mempool.add(Transaction.from_dict(tx))
+                    self.accounts[tx["sender"]].add_transaction()
+            elif event["type"] == "dropped":
+                self.mempool.remove_ids(event["txids"])
+            elif event["type"] == "block" and event["height"] == height:
+                height = self._replay_block(height)
+        
+        # A block stored just before a crash may be missing its marker
+        while height < len(self.chain):
+            height = self._replay_block(height)
+        
+        self._dirty_accounts = set(self.accounts)
+        self._commit_state()
+    
+    def _replay_block(self, height: int) -> int:
+        block = self.chain[height]
+        self._apply_transactions(block.transactions)
+        self.index.add_block(block)
+        self.difficulty = block.difficulty
+        self.blocks_mined += 1
+        # Mined transactions leave the mempool
+        self.mempool.remove(tx for tx in block.transactions if isinstance(tx, Transaction))
+        return height + 1
+    
+    def _commit_state(self):
+        # One batched tree update for every account touched since the last
+        # block, so shared upper paths are rehashed once
+        self.state_tree.update_batch({
+            key_for(address): self.accounts[address].state_hash()
+            for address in self._dirty_accounts if address in self.accounts
+        })
+        self._dirty_accounts.clear()
+    
+    def _block_records(self, start: int) -> List[Dict]:
+        if self.store is not None:
+            return [self.store.read_record(height) for height in range(start, len(self.chain))]
+        return [block.to_dict() for block in self.chain[start:]]
+    
+    def validate_chain(self, incremental: bool = False, workers: Optional[int] = None,
+                       full_state: bool = False) -> ValidationReport:
+        # Checks linkage, the difficulty and coinbase rules, recomputes every
+        # block hash and its proof of work (in a process pool for long
+        # chains), and replays all balances into a fresh state tree to check
+        # the state roots of the first and last blocks checked, or of every
+        # block with full_state=True. With incremental=True only blocks
+        # after the last clean run are checked.
+        start_time = time.perf_counter()
+        if incremental and self._validation_checkpoint:
+            height, previous_hash, balances, state_tree = self._validation_checkpoint
+            balances, state_tree = dict(balances), state_tree.copy()
+        else:
+            height, previous_hash, balances, state_tree = 0, "0" * 64, {}, SparseMerkleTree()
+        
+        records = self._block_records(height)
+        load_time = time.perf_counter() - start_time
+        
+        def state_root(changed: Dict[str, int]) -> str:
+            # The state tree rebuilt from the replayed balances alone
+            state_tree.update_batch({
+                key_for(address): account_state_hash(address, balance) for address, balance in changed.items()
+            })
+            return state_tree.root.hex()
+        
+        report = validate_records(records, Block.from_dict, height, previous_hash, balances,
+                                  STARTING_BALANCE, COINBASE_ADDRESS, workers, self.mining_reward,
+                                  self._difficulty_rule(records, height), state_root, full_state)
+        
+        errors = list(report.errors)
+        for address in balances:
+            if address not in self.accounts:
+                errors.append(f"Unknown account {address} appears in the chain")
+        for address, account in self.accounts.items():
+            if balances.get(address, STARTING_BALANCE) != account.balance:
+                errors.append(f"Account {address} balance does not match the chain")
+        
+        timings = {"load": load_time, **report.timings, "total": time.perf_counter() - start_time}
+        if not errors:
+            last_hash = records[-1]["hash"] if records else previous_hash
+            self._validation_checkpoint = (len(self.chain), last_hash, balances, state_tree)
+        return ValidationReport(not errors, report.blocks_checked, errors, timings)
+    
+    def get_account_proof(self, address: str) -> SparseMerkleProof:
+        # Proves the account's balance, or its absence, against the state
+        # root of the latest block
+        return self.state_tree.get_proof(key_for(address))
     
     def get_blockchain_stats(self) -> Dict:
         return {
             "total_blocks": len(self.chain),
-            "total_transactions": sum(len(block.transactions) for block in self.chain),
+            "total_transactions": self.index.total_transactions,
             "total_coins": self.total_coins,
             "difficulty": self.difficulty,
-            "pending_transactions": len(self.pending_transactions),
+            "pending_transactions": len(self.mempool),
             "accounts": len(self.accounts)
         }
     
+    def get_transaction(self, tx_id: str) -> Dict:
+        location = self.index.find_transaction(tx_id)
+        if location is None:
+            return None
+        block_index, position = location
+        return {
+            "id": tx_id,
+            "block": block_index,
+            "position": position,
+            **self.chain[block_index].transactions[position]
+        }
+    
+    def get_address_history(self, address: str) -> List[Dict]:
+        history = []
+        for block_index, position in self.index.address_history(address):
+            tx = self.chain[block_index].transactions[position]
+            history.append({
+                "id": transaction_id(tx),
+                "block": block_index,
+                "position": position,
+                **tx
+            })
+        return history
+    
+    def get_block_by_hash(self, block_hash: str) -> Block:
+        block_index = self.index.find_block(block_hash)
+        return None if block_index is None else self.chain[block_index]
+    
     def get_block_info(self, block_index: int) -> Dict:
         if 0 <= block_index < len(self.chain):
             block = self.chain[block_index]
@@ -183,7 +728,8 @@ class Blockchain:
                 "miner": block.miner,
                 "transactions": len(block.transactions),
                 "size": block.size,
-                "difficulty": block.difficulty
+                "difficulty": block.difficulty,
+                "state_root": block.state_root
             }
         return None
 
@@ -239,11 +785,22 @@ def display_account_selection():
     return Prompt.ask("Select account number", choices=[str(i) for i in range(1, len(accounts) + 1)])
 
 def main():
+    parser = argparse.ArgumentParser(description='Interactive blockchain demo')
+    parser.add_argument('--data-dir', type=str, default=None,
+                      help='Directory to persist the chain in and reload it from (default: in memory only)')
+    parser.add_argument('--no-ui', action='store_true',
+                      help='Mine blocks without the live progress display')
+    args = parser.parse_args()
+    
     global blockchain
-    blockchain = Blockchain()
+    blockchain = Blockchain(args.data_dir)
     
-    accounts = [blockchain.create_account() for _ in range(3)]
-    console.print(f"[green]Created {len(accounts)} accounts[/green]")
+    if blockchain.accounts:
+        accounts = list(blockchain.accounts)
+        console.print(f"[green]Loaded {len(blockchain.chain)} blocks and {len(accounts)} accounts[/green]")
+    else:
+        accounts = [blockchain.create_account() for _ in range(3)]
+        console.print(f"[green]Created {len(accounts)} accounts[/green]")
     
     blockchain.switch_account(accounts[0])
     
@@ -290,7 +847,11 @@ def main():
                 console.print("[red]No account selected[/red]")
                 continue
                 
-            block = blockchain.mine_pending_transactions(blockchain.get_current_account())
+            if args.no_ui:
+                block = blockchain.mine_pending_transactions(blockchain.get_current_account())
+            else:
+                with RichProgress() as progress:
+                    block = blockchain.mine_pending_transactions(blockchain.get_current_account(), progress)
             if block:
                 console.print(f"[green]Block mined: {block.hash}[/green]")
             else:
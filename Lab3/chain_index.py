@@ -0,0 +1,89 @@
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple, Union
+from serialization import Transaction
+
+def transaction_id(tx: Union[Transaction, Dict]) -> str:
+    # Legacy blocks hold plain dicts, hashed in their canonical JSON form
+    if isinstance(tx, Transaction):
+        return tx.txid()
+    return hashlib.sha256(json.dumps(tx, sort_keys=True).encode()).hexdigest()
+
+class ChainIndex:
+    """Lookup tables maintained as blocks are appended to the chain.
+
+    Positions are (block index, transaction position) pairs, so every query
+    costs O(1) or O(k) in the number of results instead of a chain scan.
+    """
+
+    def __init__(self):
+        self.transactions: Dict[str, Tuple[int, int]] = {}
+        self.addresses: Dict[str, List[Tuple[int, int]]] = {}
+        self.block_hashes: Dict[str, int] = {}
+        self.total_transactions = 0
+        self._unindexed = None
+        self._unindexed_count = 0
+
+    def attach(self, chain, count: int, total_transactions: int):
+        # The first count blocks of a reloaded chain are indexed on the first
+        # lookup rather than at startup; running totals come from a snapshot
+        self._unindexed = chain
+        self._unindexed_count = count
+        self.total_transactions = total_transactions
+
+    def _catch_up(self):
+        if self._unindexed is None:
+            return
+        chain, count = self._unindexed, self._unindexed_count
+        self._unindexed = None
+
+        newer = self.addresses
+        self.addresses = {}
+        for block_index in range(count):
+            self._index_block(chain[block_index])
+        # Blocks indexed since the reload come after the older history
+        for address, locations in newer.items():
+            self.addresses.setdefault(address, []).extend(locations)
+
+    def _index_block(self, block):
+        self.block_hashes[block.hash] = block.index
+        for position, tx in enumerate(block.transactions):
+            location = (block.index, position)
+            self.transactions.setdefault(transaction_id(tx), location)
+            self.addresses.setdefault(tx["sender"], []).append(location)
+            if tx["recipient"] != tx["sender"]:
+                self.addresses.setdefault(tx["recipient"], []).append(location)
+
+    def add_block(self, block):
+        self._index_block(block)
+        self.total_transactions += len(block.transactions)
+
+    def remove_block(self, block):
+        # Undo add_block for the block at the tip, e.g. in a reorganization
+        self._catch_up()
+        del self.block_hashes[block.hash]
+        addresses = set()
+        for position, tx in enumerate(block.transactions):
+            tx_id = transaction_id(tx)
+            if self.transactions.get(tx_id) == (block.index, position):
+                del self.transactions[tx_id]
+            addresses.update((tx["sender"], tx["recipient"]))
+        for address in addresses:
+            locations = self.addresses[address]
+            while locations and locations[-1][0] == block.index:
+                locations.pop()
+            if not locations:
+                del self.addresses[address]
+        self.total_transactions -= len(block.transactions)
+
+    def find_transaction(self, tx_id: str) -> Optional[Tuple[int, int]]:
+        self._catch_up()
+        return self.transactions.get(tx_id)
+
+    def address_history(self, address: str) -> List[Tuple[int, int]]:
+        self._catch_up()
+        return self.addresses.get(address, [])
+
+    def find_block(self, block_hash: str) -> Optional[int]:
+        self._catch_up()
+        return self.block_hashes.get(block_hash)
@@ -0,0 +1,65 @@
+import math
+
+HASH_BITS = 256
+HEX_DIGITS = HASH_BITS // 4
+
+class Target:
+    """Proof-of-work target compiled to a range of raw SHA-256 digests.
+
+    A digest meets the target when lower <= int(digest) < upper. Checks
+    compare the 32-byte digest directly against precomputed bounds, so no
+    hex encoding happens per attempt.
+    """
+
+    __slots__ = ("lower", "upper", "_lower_bytes", "_max_bytes")
+
+    def __init__(self, lower: int, upper: int):
+        if not 0 <= lower < upper <= 2**HASH_BITS:
+            raise ValueError(f"Invalid target range [{lower}, {upper})")
+        self.lower = lower
+        self.upper = upper
+        # Big-endian byte strings of equal length compare like the integers
+        self._lower_bytes = lower.to_bytes(32, "big")
+        self._max_bytes = (upper - 1).to_bytes(32, "big")
+
+    @classmethod
+    def from_hex_prefix(cls, prefix: str) -> "Target":
+        # Digests whose hex form starts with prefix form one contiguous range
+        if len(prefix) > HEX_DIGITS:
+            raise ValueError(f"Prefix longer than {HEX_DIGITS} hex digits")
+        try:
+            value = int(prefix, 16) if prefix else 0
+        except ValueError:
+            raise ValueError(f"Prefix is not hexadecimal: {prefix!r}") from None
+        width = 1 << (4 * (HEX_DIGITS - len(prefix)))
+        return cls(value * width, (value + 1) * width)
+
+    @classmethod
+    def from_leading_zero_bits(cls, bits: float) -> "Target":
+        # Fractional bit counts give difficulty steps finer than one bit
+        if not 0 <= bits <= HASH_BITS:
+            raise ValueError(f"Leading zero bits must be between 0 and {HASH_BITS}")
+        if float(bits).is_integer():
+            upper = 1 << (HASH_BITS - int(bits))
+        else:
+            upper = max(1, int(2 ** (HASH_BITS - bits)))
+        return cls(0, upper)
+
+    @classmethod
+    def from_difficulty(cls, difficulty: float) -> "Target":
+        # Blockchain difficulty counts leading zero hex digits (4 bits each)
+        return cls.from_leading_zero_bits(difficulty * 4)
+
+    @property
+    def bits(self) -> float:
+        return HASH_BITS - math.log2(self.upper - self.lower)
+
+    @property
+    def expected_attempts(self) -> float:
+        return 2**HASH_BITS / (self.upper - self.lower)
+
+    def is_met(self, digest: bytes) -> bool:
+        return self._lower_bytes <= digest <= self._max_bytes
+
+    def __repr__(self) -> str:
+        return f"Target(bits={self.bits:.2f})"
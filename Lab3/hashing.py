@@ -0,0 +1,75 @@
+import hashlib
+import struct
+
+# ASCII codes used when incrementing nonce digits in place
+_DIGIT_ZERO = ord("0")
+_DIGIT_NINE = ord("9")
+
+class NonceCounter:
+    """Decimal nonce kept as ASCII digits in a reusable buffer."""
+
+    __slots__ = ("value", "digits")
+
+    def __init__(self, start: int = 0):
+        self.value = start
+        self.digits = bytearray(str(start).encode())
+
+    def increment(self):
+        self.value += 1
+        digits = self.digits
+
+        # Add one to the last digit and carry, like an odometer
+        i = len(digits) - 1
+        while i >= 0:
+            if digits[i] != _DIGIT_NINE:
+                digits[i] += 1
+                return
+            digits[i] = _DIGIT_ZERO
+            i -= 1
+
+        # Every digit rolled over (e.g. 999 -> 1000)
+        digits.insert(0, _DIGIT_ZERO + 1)
+
+_UINT64 = struct.Struct(">Q")
+
+class BinaryNonceCounter:
+    """Nonce kept as 8 big-endian bytes in a reusable buffer.
+
+    Same interface as NonceCounter, for binary block headers.
+    """
+
+    __slots__ = ("value", "digits")
+
+    def __init__(self, start: int = 0):
+        self.value = start
+        self.digits = bytearray(_UINT64.pack(start))
+
+    def increment(self):
+        self.value += 1
+        _UINT64.pack_into(self.digits, 0, self.value)
+
+class MidstateHasher:
+    """SHA-256 of prefix + nonce + suffix with the prefix absorbed only once.
+
+    The digest is byte-identical to hashing the concatenated message from
+    scratch; only the nonce and the suffix are fed per attempt.
+    """
+
+    __slots__ = ("_prefix_state", "_suffix")
+
+    def __init__(self, prefix: bytes, suffix: bytes = b""):
+        self._prefix_state = hashlib.sha256(prefix)
+        self._suffix = suffix
+
+    def _state(self, nonce_digits) -> "hashlib._Hash":
+        state = self._prefix_state.copy()
+        state.update(nonce_digits)
+        if self._suffix:
+            state.update(self._suffix)
+        return state
+
+    def digest(self, nonce_digits) -> bytes:
+        return self._state(nonce_digits).digest()
+
+    def hexdigest(self, nonce_digits) -> str:
+        return self._state(nonce_digits).hexdigest()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Lab3 builds on the Lab2 Merkle trees. Modules that import from Lab2
+# import this first, which puts Lab2 on the import path once.
+LAB2_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Lab2")
+if LAB2_DIR not in sys.path:
+    sys.path.append(LAB2_DIR)
@@ -0,0 +1,117 @@
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional
+from serialization import Transaction
+import metrics
+
+DEFAULT_CAPACITY = 100_000
+
+class Mempool:
+    """Bounded pool of unconfirmed transactions, oldest first.
+
+    Tracks how much each sender has already committed to pending
+    transactions, so admission checks spends against the confirmed balance
+    minus those commitments. Transactions handed out by take() stay
+    committed while their block is mined, until remove() confirms them or
+    requeue() puts them back. Duplicates are rejected by transaction id in
+    O(1). When full, the oldest transactions are evicted to make room.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._entries: "OrderedDict[str, Transaction]" = OrderedDict()
+        # Taken by take() for a block that is not committed yet
+        self._in_flight: Dict[str, Transaction] = {}
+        self._pending_spend: Dict[str, int] = {}
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[Transaction]:
+        return iter(self._entries.values())
+
+    def __contains__(self, tx_id: str) -> bool:
+        return tx_id in self._entries
+
+    def unconfirmed(self) -> List[Transaction]:
+        # Queued and in-flight transactions, e.g. for a snapshot
+        return list(self._in_flight.values()) + list(self._entries.values())
+
+    def pending_spend(self, sender: str) -> int:
+        return self._pending_spend.get(sender, 0)
+
+    def add(self, tx: Transaction, balance: Optional[int] = None) -> bool:
+        # balance is the sender's confirmed balance; None skips the check
+        # (used when replaying transactions that were admitted before)
+        tx_id = tx.txid()
+        if tx_id in self._entries or tx_id in self._in_flight:
+            return False
+        if balance is not None and tx.amount > balance - self._pending_spend.get(tx.sender, 0):
+            return False
+
+        while len(self._entries) >= self.capacity:
+            self._release(self._entries.popitem(last=False)[1])
+            self.evicted += 1
+
+        self._entries[tx_id] = tx
+        self._pending_spend[tx.sender] = self._pending_spend.get(tx.sender, 0) + tx.amount
+        if metrics.enabled:
+            metrics.MEMPOOL_SIZE.set(len(self._entries))
+        return True
+
+    def _release(self, tx: Transaction):
+        remaining = self._pending_spend[tx.sender] - tx.amount
+        if remaining:
+            self._pending_spend[tx.sender] = remaining
+        else:
+            del self._pending_spend[tx.sender]
+
+    def take(self, limit: int) -> List[Transaction]:
+        # Remove and return up to limit transactions, oldest first. Their
+        # spends stay counted until remove() or requeue().
+        taken = []
+        while self._entries and len(taken) < limit:
+            tx_id, tx = self._entries.popitem(last=False)
+            self._in_flight[tx_id] = tx
+            taken.append(tx)
+        if metrics.enabled:
+            metrics.MEMPOOL_SIZE.set(len(self._entries))
+        return taken
+
+    def requeue(self, transactions: Iterable[Transaction]):
+        # Put previously taken transactions back ahead of everything else,
+        # in their original order, without checking balances again. Those
+        # from a replaced block were not in flight and are counted again.
+        for tx in reversed(list(transactions)):
+            tx_id = tx.txid()
+            if tx_id in self._entries:
+                continue
+            if self._in_flight.pop(tx_id, None) is None:
+                self._pending_spend[tx.sender] = self._pending_spend.get(tx.sender, 0) + tx.amount
+            self._entries[tx_id] = tx
+            self._entries.move_to_end(tx_id, last=False)
+
+        while len(self._entries) > self.capacity:
+            self._release(self._entries.popitem(last=False)[1])
+            self.evicted += 1
+        if metrics.enabled:
+            metrics.MEMPOOL_SIZE.set(len(self._entries))
+
+    def remove(self, transactions: Iterable[Transaction]):
+        # Confirmed (or dropped) transactions, whether queued or in flight
+        self.remove_ids(tx.txid() for tx in transactions)
+
+    def remove_ids(self, tx_ids: Iterable[str]):
+        for tx_id in tx_ids:
+            tx = self._entries.pop(tx_id, None) or self._in_flight.pop(tx_id, None)
+            if tx is not None:
+                self._release(tx)
+        if metrics.enabled:
+            metrics.MEMPOOL_SIZE.set(len(self._entries))
+
+    def clear(self):
+        self._entries.clear()
+        self._in_flight.clear()
+        self._pending_spend.clear()
+        if metrics.enabled:
+            metrics.MEMPOOL_SIZE.set(0)
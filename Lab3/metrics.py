@@ -0,0 +1,234 @@
+import argparse
+import bisect
+import cProfile
+import io
+import json
+import pstats
+import tracemalloc
+from typing import Callable, Dict, Sequence, Tuple
+
+# Instrumented code checks this flag before timing or counting anything,
+# so with metrics disabled each call site costs one attribute lookup
+enabled = False
+
+# Upper bounds in seconds, from a microsecond to ten seconds
+DEFAULT_BUCKETS = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 0.1, 1.0, 10.0)
+
+class Counter:
+    __slots__ = ("name", "help", "value")
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def reset(self):
+        self.value = 0
+
+    def samples(self):
+        yield self.name, self.value
+
+    def to_dict(self) -> Dict:
+        return {"type": self.kind, "value": self.value}
+
+class Gauge(Counter):
+    __slots__ = ()
+    kind = "gauge"
+
+    def set(self, value: float):
+        self.value = value
+
+class Histogram:
+    """Counts of observations per bucket, plus their sum and count."""
+
+    __slots__ = ("name", "help", "buckets", "counts", "sum", "count")
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.reset()
+
+    def reset(self):
+        # One slot per bucket plus one for values above the largest bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        # Prometheus buckets are cumulative
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{self.name}_bucket{{le="{bound:g}"}}', cumulative
+        yield f'{self.name}_bucket{{le="+Inf"}}', self.count
+        yield f"{self.name}_sum", self.sum
+        yield f"{self.name}_count", self.count
+
+    def to_dict(self) -> Dict:
+        return {
+            "type": self.kind,
+            "buckets": dict(zip([f"{bound:g}" for bound in self.buckets] + ["+Inf"], self.counts)),
+            "sum": self.sum,
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.0
+        }
+
+def _format_value(value: float) -> str:
+    # Counts print exactly; floats at full precision, since a rounded
+    # counter would throw off rates computed from it
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._register(Counter(name, help))
+
+    def gauge(self, name: str, help: str) -> Gauge:
+        return self._register(Gauge(name, help))
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, buckets))
+
+    def reset(self):
+        for metric in self._metrics.values():
+            metric.reset()
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name} {_format_value(value)}" for name, value in metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> Dict:
+        return {name: metric.to_dict() for name, metric in self._metrics.items()}
+
+REGISTRY = Registry()
+
+HASH_ATTEMPTS = REGISTRY.counter("bct_hash_attempts_total", "Nonces hashed while mining")
+MINING_SECONDS = REGISTRY.histogram("bct_mining_seconds", "Time to find a block's nonce",
+                                    (0.01, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0))
+BLOCK_SERIALIZATION_SECONDS = REGISTRY.histogram("bct_block_serialization_seconds",
+                                                 "Time to encode a block to its binary form")
+MERKLE_LEAF_SECONDS = REGISTRY.histogram("bct_merkle_leaf_seconds", "Merkle build time spent hashing leaves")
+MERKLE_LEVEL_SECONDS = REGISTRY.histogram("bct_merkle_level_seconds",
+                                          "Merkle build time spent hashing interior levels")
+MEMPOOL_SIZE = REGISTRY.gauge("bct_mempool_transactions", "Transactions waiting in the mempool")
+BLOCK_APPLY_SECONDS = REGISTRY.histogram("bct_block_apply_seconds",
+                                         "Time to apply a block's transactions and commit the state root")
+STORE_APPEND_SECONDS = REGISTRY.histogram("bct_store_append_seconds", "Time to write a block to the block store")
+
+def enable():
+    global enabled
+    enabled = True
+
+def disable():
+    global enabled
+    enabled = False
+
+def export(format: str = "prometheus") -> str:
+    if format == "prometheus":
+        return REGISTRY.to_prometheus()
+    if format == "json":
+        return json.dumps(REGISTRY.to_dict(), indent=2)
+    raise ValueError(f"Unknown metrics format {format!r}, expected 'prometheus' or 'json'")
+
+def capture(function: Callable, profile: bool = True, memory: bool = True,
+            top: int = 15) -> Tuple[object, Dict[str, str]]:
+    # Run function once under cProfile and/or tracemalloc and return its
+    # result with text reports of the hottest functions and allocation sites
+    reports = {}
+    profiler = cProfile.Profile() if profile else None
+    if memory:
+        tracemalloc.start()
+    try:
+        if profiler:
+            profiler.enable()
+        try:
+            result = function()
+        finally:
+            if profiler:
+                profiler.disable()
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if memory:
+            tracemalloc.stop()
+
+    if profiler:
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(top)
+        reports["profile"] = stream.getvalue()
+    if memory:
+        lines = [f"Traced memory: {current / 1024:.1f} KB current, {peak / 1024:.1f} KB peak"]
+        lines += [str(stat) for stat in snapshot.statistics("lineno")[:top]]
+        reports["memory"] = "\n".join(lines)
+    return result, reports
+
+def main():
+    parser = argparse.ArgumentParser(description='Mine blocks with metrics enabled and export them')
+    parser.add_argument('--blocks', type=int, default=5,
+                      help='Blocks to mine (default: 5)')
+    parser.add_argument('--transactions', type=int, default=200,
+                      help='Transactions per block (default: 200)')
+    parser.add_argument('--difficulty', type=float, default=4,
+                      help='Leading zero hex digits required of block hashes (default: 4)')
+    parser.add_argument('--format', choices=("prometheus", "json"), default="prometheus",
+                      help='Export format (default: prometheus)')
+    parser.add_argument('--profile', action='store_true',
+                      help='Run the last block under cProfile and print the hottest functions')
+    parser.add_argument('--trace-memory', action='store_true',
+                      help='Run the last block under tracemalloc and print the top allocation sites')
+
+    args = parser.parse_args()
+
+    # When run as a script this file is __main__, while the instrumented
+    # modules import it as metrics; enable and export that instance
+    import metrics
+    from blockchain import Blockchain
+    metrics.enable()
+    blockchain = Blockchain()
+    blockchain.difficulty = args.difficulty
+    accounts = [blockchain.create_account(f"0x{i + 1:064x}") for i in range(args.transactions)]
+
+    def mine_one():
+        # Coins move around a ring, so balances never run out
+        for i, sender in enumerate(accounts):
+            blockchain.create_transaction(sender, accounts[(i + 1) % len(accounts)], 1)
+        return blockchain.mine_pending_transactions(accounts[0])
+
+    for _ in range(args.blocks - 1):
+        mine_one()
+    if args.profile or args.trace_memory:
+        _, reports = metrics.capture(mine_one, args.profile, args.trace_memory)
+    else:
+        mine_one()
+        reports = {}
+
+    print(metrics.export(args.format))
+    for report in reports.values():
+        print(report)
+
+if __name__ == "__main__":
+    main()
+
+# python metrics.py --blocks 10 --transactions 500
+# python metrics.py --format json --profile --trace-memory
@@ -0,0 +1,200 @@
+import argparse
+import time
+from typing import Callable, NamedTuple, Optional
+from difficulty import Target
+import batch_sha256
+import metrics
+
+BACKENDS = ("scalar", "batch")
+
+# Attempts between clock checks in the scalar loop, and the shortest gap
+# between two progress reports (at most 10 per second)
+CHECK_INTERVAL = 4096
+DEFAULT_REPORT_INTERVAL = 0.1
+
+class MiningProgress(NamedTuple):
+    attempts: int
+    elapsed: float
+
+    @property
+    def hashes_per_second(self) -> float:
+        return self.attempts / self.elapsed if self.elapsed > 0 else 0.0
+
+class MiningResult(NamedTuple):
+    nonce: int
+    digest: bytes
+    attempts: int
+    time_taken: float
+
+    @property
+    def hashes_per_second(self) -> float:
+        return self.attempts / self.time_taken if self.time_taken > 0 else 0.0
+
+ProgressCallback = Callable[[MiningProgress], None]
+
+def scan(hasher, counter, target: Target, count: int) -> Optional[bytes]:
+    # Try up to count nonces from the counter's current value. On a match
+    # the counter is left on the winning nonce and its digest is returned.
+    digits = counter.digits
+    is_met = target.is_met
+    for _ in range(count):
+        digest = hasher.digest(digits)
+        if is_met(digest):
+            return digest
+        counter.increment()
+    return None
+
+def mine(block, target: Target, backend: str = "scalar", progress: Optional[ProgressCallback] = None,
+         report_interval: float = DEFAULT_REPORT_INTERVAL, max_attempts: Optional[int] = None,
+         cancelled: Optional[Callable[[], bool]] = None) -> Optional[MiningResult]:
+    """Search the block's nonces from block.nonce until one meets target.
+
+    Nothing is printed and the block is not modified. progress, if given,
+    is called at most once per report_interval with the attempts so far;
+    cancelled is polled at the same points. Returns None if max_attempts
+    run out or cancelled() returns True first.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    use_batch = backend == "batch" and batch_sha256.available()
+    step = batch_sha256.DEFAULT_BATCH_SIZE if use_batch else CHECK_INTERVAL
+    if use_batch:
+        hasher = block.batch_hasher()
+    else:
+        hasher = block.hasher()
+        counter = block.nonce_counter()
+
+    start_nonce = block.nonce
+    start_time = time.perf_counter()
+    next_report = start_time + report_interval
+    attempts = 0
+    while max_attempts is None or attempts < max_attempts:
+        count = step if max_attempts is None else min(step, max_attempts - attempts)
+        if use_batch:
+            nonce, digest = hasher.sweep(start_nonce + attempts, count, target)
+        else:
+            digest = scan(hasher, counter, target, count)
+            nonce = counter.value
+        if digest is not None:
+            attempts = nonce - start_nonce + 1
+            elapsed = time.perf_counter() - start_time
+            if progress is not None:
+                progress(MiningProgress(attempts, elapsed))
+            if metrics.enabled:
+                metrics.HASH_ATTEMPTS.inc(attempts)
+                metrics.MINING_SECONDS.observe(elapsed)
+            return MiningResult(nonce, digest, attempts, elapsed)
+        attempts += count
+
+        now = time.perf_counter()
+        if now >= next_report:
+            next_report = now + report_interval
+            if progress is not None:
+                progress(MiningProgress(attempts, now - start_time))
+            if cancelled is not None and cancelled():
+                break
+    if metrics.enabled:
+        metrics.HASH_ATTEMPTS.inc(attempts)
+    return None
+
+class RichProgress:
+    """Progress callback that draws a Rich spinner with attempts and rate.
+
+    Use as a context manager around mine(); Rich is only imported here, so
+    the engine itself runs without it.
+    """
+
+    def __init__(self, description: str = "[cyan]Mining block..."):
+        self.description = description
+        self._progress = None
+        self._task = None
+
+    def __enter__(self) -> "RichProgress":
+        from rich.progress import Progress, SpinnerColumn, TextColumn, TimeElapsedColumn
+        self._progress = Progress(SpinnerColumn(), TextColumn("{task.description}"),
+                                  TextColumn("{task.completed:,.0f} hashes"),
+                                  TextColumn("{task.fields[rate]}"), TimeElapsedColumn())
+        self._progress.__enter__()
+        self._task = self._progress.add_task(self.description, total=None, rate="")
+        return self
+
+    def __exit__(self, *exc_info):
+        self._progress.__exit__(*exc_info)
+
+    def __call__(self, report: MiningProgress):
+        self._progress.update(self._task, completed=report.attempts,
+                              rate=f"{report.hashes_per_second:,.0f} H/s")
+
+def compare_ui(attempts: int = 500_000) -> dict:
+    # Hash rate over the same nonces headless, with the rate-limited Rich
+    # display, and with a Rich update on every attempt as mining used to do
+    from rich.progress import Progress
+    from blockchain import Block
+
+    block = Block(1, [], time.time(), "0" * 64)
+    target = Target(0, 1)
+    rates = {}
+
+    rates["headless"] = attempts / _timed(lambda: mine(block, target, max_attempts=attempts))
+    with RichProgress() as display:
+        rates["rate-limited UI"] = attempts / _timed(lambda: mine(block, target, progress=display,
+                                                                 max_attempts=attempts))
+
+    def per_attempt():
+        hasher, counter = block.hasher(), block.nonce_counter()
+        with Progress() as progress:
+            task = progress.add_task("[cyan]Mining block...", total=None)
+            for _ in range(attempts):
+                target.is_met(hasher.digest(counter.digits))
+                counter.increment()
+                progress.update(task, advance=1)
+    rates["per-attempt UI"] = attempts / _timed(per_attempt)
+    return rates
+
+def _timed(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Mine a block headless or with a progress display')
+    parser.add_argument('--difficulty', type=float, default=5,
+                      help='Leading zero hex digits required of the hash (default: 5)')
+    parser.add_argument('--backend', choices=BACKENDS, default="scalar",
+                      help='Hash one nonce per call or NumPy batches of nonces (default: scalar)')
+    parser.add_argument('--no-ui', action='store_true',
+                      help='Mine without the progress display')
+    parser.add_argument('--compare-ui', action='store_true',
+                      help='Measure hash throughput with and without the progress display and exit')
+    parser.add_argument('--attempts', type=int, default=500_000,
+                      help='Nonces hashed per configuration with --compare-ui (default: 500000)')
+
+    args = parser.parse_args()
+
+    if args.compare_ui:
+        rates = compare_ui(args.attempts)
+        for name, rate in rates.items():
+            print(f"{name:>16}: {rate:,.0f} H/s ({rate / rates['headless']:.2f}x)")
+        return
+
+    from blockchain import Block
+    block = Block(1, [], time.time(), "0" * 64)
+    target = Target.from_difficulty(args.difficulty)
+    if args.no_ui:
+        result = mine(block, target, args.backend)
+    else:
+        with RichProgress() as display:
+            result = mine(block, target, args.backend, progress=display)
+
+    print(f"Nonce: {result.nonce}")
+    print(f"Hash: {result.digest.hex()}")
+    print(f"Time taken: {result.time_taken:.2f} seconds")
+    print(f"Hashes computed: {result.attempts}")
+    print(f"Hash rate: {result.hashes_per_second:,.0f} H/s")
+
+if __name__ == "__main__":
+    main()
+
+# python mining.py --difficulty 5
+# python mining.py --difficulty 5 --no-ui
+# python mining.py --compare-ui
@@ -0,0 +1,436 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from urllib.parse import parse_qs, urlsplit
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from hashing import BinaryNonceCounter, MidstateHasher, NonceCounter
+from difficulty import Target
+from mining import scan
+from retarget import DEFAULT_WINDOW, Retargeter
+import metrics
+from serialization import BLOCK_VERSION, Transaction
+from blockchain import Block, Blockchain
+
+# Nonces searched per executor call; the miner checks for a new tip between
+# calls, so this bounds how long a stale block keeps being mined
+DEFAULT_MINING_CHUNK = 20_000
+
+DEFAULT_PORT = 8545
+# Most blocks returned by one range request
+MAX_RANGE = 500
+MAX_BODY_SIZE = 64 * 1024 * 1024
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large"}
+
+def _lower_priority():
+    # Mining workers yield the CPU to the node's event loop, which keeps
+    # request latency and block relay fast on machines with few cores
+    if hasattr(os, "nice"):
+        os.nice(10)
+
+def _search_chunk(prefix: bytes, suffix: bytes, binary: bool, target: Target,
+                  start: int, count: int) -> Tuple[Optional[int], Optional[bytes]]:
+    # Runs in the mining executor: try nonces [start, start + count) of a
+    # block given by its hash parts and return the first that meets target
+    counter = BinaryNonceCounter(start) if binary else NonceCounter(start)
+    digest = scan(MidstateHasher(prefix, suffix), counter, target, count)
+    return (None, None) if digest is None else (counter.value, digest)
+
+class MessageTooLarge(ValueError):
+    """A message body over MAX_BODY_SIZE, answered with 413 rather than 400."""
+
+async def read_message(reader: asyncio.StreamReader) -> Optional[Tuple[str, Dict[str, str], bytes]]:
+    # One HTTP/1.1 request or response: start line, headers and body.
+    # Returns None when the peer closed the connection between messages.
+    start_line = await reader.readline()
+    if not start_line:
+        return None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = headers.get("content-length", "0")
+    if not length.isdigit():
+        raise ValueError(f"Invalid Content-Length {length!r}")
+    length = int(length)
+    if length > MAX_BODY_SIZE:
+        raise MessageTooLarge("Message body too large")
+    body = await reader.readexactly(length) if length else b""
+    return start_line.decode("latin-1").strip(), headers, body
+
+def _encode_message(start_line: str, payload) -> bytes:
+    body = json.dumps(payload).encode()
+    return (f"{start_line}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n").encode() + body
+
+async def http_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                       method: str, path: str, payload=None) -> Tuple[int, object]:
+    # Send one request over a kept-alive connection and return the status
+    # and decoded JSON body of the response
+    writer.write(_encode_message(f"{method} {path} HTTP/1.1", payload))
+    await writer.drain()
+    message = await read_message(reader)
+    if message is None:
+        raise ConnectionError("Node closed the connection")
+    status_line, _, body = message
+    return int(status_line.split()[1]), json.loads(body) if body else None
+
+class NodeService:
+    """Serves a Blockchain over HTTP while mining it in the background.
+
+    Requests are handled on the event loop, which owns all chain state. The
+    proof-of-work search runs chunk by chunk in an executor, so queries and
+    transaction submissions are answered while a block is being mined. When
+    another block extends the tip first, the stale block is abandoned and
+    its transactions return to the mempool.
+    """
+
+    def __init__(self, blockchain: Blockchain, miner_address: Optional[str] = None,
+                 executor: Optional[Executor] = None, chunk_size: int = DEFAULT_MINING_CHUNK):
+        self.blockchain = blockchain
+        self.miner_address = miner_address or blockchain.create_account()
+        self.chunk_size = chunk_size
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._server = None
+        self._mining_task = None
+        self._connections = set()
+        # Set whenever the mempool gains transactions worth mining
+        self._work_available = asyncio.Event()
+        self.blocks_mined = 0
+        self.blocks_abandoned = 0
+        self.blocks_received = 0
+        # Wall-clock seconds spent with a block being mined
+        self.mining_seconds = 0.0
+
+    async def start(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(1, initializer=_lower_priority)
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        self._mining_task = asyncio.get_running_loop().create_task(self._mine_forever())
+        if len(self.blockchain.mempool):
+            self._work_available.set()
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._mining_task.cancel()
+        try:
+            await self._mining_task
+        except asyncio.CancelledError:
+            pass
+        self._server.close()
+        for task in self._connections:
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        await self._server.wait_closed()
+        if self._owns_executor:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def _mine_forever(self):
+        while True:
+            if not len(self.blockchain.mempool):
+                self._work_available.clear()
+                await self._work_available.wait()
+
+            block = self.blockchain.prepare_block(self.miner_address)
+            start = time.perf_counter()
+            try:
+                mined = await self._mine_block(block)
+            except asyncio.CancelledError:
+                self.blockchain.abandon_block(block)
+                raise
+            finally:
+                self.mining_seconds += time.perf_counter() - start
+            if mined:
+                self.blockchain.commit_block(block)
+                self.blocks_mined += 1
+                self.block_added(block, None)
+            else:
+                self.blockchain.abandon_block(block)
+                self.blocks_abandoned += 1
+
+    async def _mine_block(self, block: Block) -> bool:
+        # Search chunk after chunk until a nonce is found or the block no
+        # longer extends the tip
+        loop = asyncio.get_running_loop()
+        prefix, suffix = block._hash_parts()
+        binary = block.version >= BLOCK_VERSION
+        target = Target.from_difficulty(block.difficulty)
+        start = block.nonce
+        while self.blockchain.chain[-1].hash == block.previous_hash:
+            nonce, digest = await loop.run_in_executor(
+                self._executor, _search_chunk, prefix, suffix, binary, target, start, self.chunk_size)
+            if metrics.enabled:
+                # The executor process has its own registry, so attempts
+                # are counted here
+                metrics.HASH_ATTEMPTS.inc(self.chunk_size if nonce is None else nonce - start + 1)
+            if nonce is not None:
+                if self.blockchain.chain[-1].hash != block.previous_hash:
+                    return False
+                block.nonce = nonce
+                block.hash = digest.hex()
+                return True
+            start += self.chunk_size
+        return False
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                try:
+                    message = await read_message(reader)
+                except ValueError as error:
+                    # The body was not read, so the connection cannot continue
+                    status = 413 if isinstance(error, MessageTooLarge) else 400
+                    writer.write(_encode_message(f"HTTP/1.1 {status} {_REASONS[status]}", {"error": str(error)}))
+                    break
+                if message is None:
+                    break
+                request_line, headers, body = message
+                try:
+                    method, path, _ = request_line.split(" ", 2)
+                    payload = json.loads(body) if body else None
+                    status, response = await self._route(method, path, payload)
+                except (ValueError, KeyError, TypeError) as error:
+                    status, response = 400, {"error": str(error)}
+                writer.write(_encode_message(f"HTTP/1.1 {status} {_REASONS[status]}", response))
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # stop() cancels connections that are still open; end quietly
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def accept_block(self, block: Block, origin) -> bool:
+        if not self.blockchain.receive_block(block):
+            return False
+        self.blocks_received += 1
+        self.block_added(block, origin)
+        return True
+
+    def block_added(self, block: Block, origin):
+        # Called after a mined or received block extends the chain; origin
+        # is whatever identified the sender, None for locally mined blocks
+        pass
+
+    def transactions_added(self, transactions: List[Transaction], origin):
+        # Called with the transactions a submission added to the mempool
+        pass
+
+    async def _route(self, method: str, path: str, payload) -> Tuple[int, object]:
+        blockchain = self.blockchain
+        url = urlsplit(path)
+        parts = url.path.strip("/").split("/")
+        query = parse_qs(url.query)
+
+        if method == "GET" and parts == ["stats"]:
+            return 200, {
+                **blockchain.get_blockchain_stats(),
+                "tip": blockchain.chain[-1].hash,
+                "blocks_mined_here": self.blocks_mined,
+                "blocks_abandoned": self.blocks_abandoned,
+                "blocks_received": self.blocks_received,
+                "mining_seconds": self.mining_seconds
+            }
+        if method == "GET" and parts == ["blocks"]:
+            # Range of consecutive blocks for syncing: ?start=H&count=N
+            start = int(query.get("start", ["0"])[0])
+            stop = min(len(blockchain.chain), start + min(int(query.get("count", [MAX_RANGE])[0]), MAX_RANGE))
+            return 200, [blockchain.chain[height].to_dict() for height in range(max(0, start), stop)]
+        if method == "GET" and len(parts) == 2 and parts[0] == "blocks":
+            height = int(parts[1])
+            if not 0 <= height < len(blockchain.chain):
+                return 404, {"error": f"no block {height}"}
+            return 200, blockchain.chain[height].to_dict()
+        if method == "GET" and len(parts) == 2 and parts[0] == "transactions":
+            tx = blockchain.get_transaction(parts[1])
+            return (200, tx) if tx else (404, {"error": "unknown transaction"})
+        if method == "GET" and len(parts) == 2 and parts[0] == "accounts":
+            if parts[1] not in blockchain.accounts:
+                return 404, {"error": "unknown account"}
+            return 200, blockchain.get_account_info(parts[1])
+
+        if method == "POST" and parts == ["accounts"]:
+            # An existing address may be given to register it on this node
+            if payload is not None and not isinstance(payload, dict):
+                return 400, {"error": "expected a JSON object"}
+            address = payload.get("address") if payload else None
+            return 200, {"address": blockchain.create_account(address)}
+        if method == "POST" and parts == ["transactions"]:
+            # One transaction object, a list of them, or a relayed
+            # {"transactions": [...], "origin": ...} message
+            origin = None
+            if isinstance(payload, dict) and "transactions" in payload:
+                payload, origin = payload["transactions"], payload.get("origin")
+            records = payload if isinstance(payload, list) else [payload]
+            if not all(isinstance(record, dict) for record in records):
+                return 400, {"error": "transactions must be JSON objects"}
+            transactions = [Transaction.from_dict(record) for record in records]
+            accepted = blockchain.submit_batch(transactions)
+            if any(accepted):
+                self._work_available.set()
+                self.transactions_added([tx for tx, ok in zip(transactions, accepted) if ok], origin)
+            return 200, {"accepted": accepted}
+        if method == "POST" and parts == ["blocks"]:
+            # A block, or a relayed {"block": {...}, "origin": ...} message
+            origin = None
+            if isinstance(payload, dict) and "block" in payload:
+                payload, origin = payload["block"], payload.get("origin")
+            if not isinstance(payload, dict) or not isinstance(payload.get("transactions"), list) \
+                    or not all(isinstance(tx, dict) for tx in payload["transactions"]):
+                return 400, {"error": "a block must be a JSON object with a list of transaction objects"}
+            return 200, {"accepted": await self.accept_block(Block.from_dict(payload), origin)}
+
+        return 404, {"error": f"no route for {method} {path}"}
+
+def _summarize(latencies: List[float]) -> Dict[str, float]:
+    latencies = sorted(latencies)
+    if not latencies:
+        return {"requests": 0}
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+    return {
+        "requests": len(latencies),
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": latencies[-1] * 1000
+    }
+
+async def run_load(host: str, port: int, clients: int = 8, duration: float = 10.0,
+                   batch_size: int = 100) -> Dict[str, Dict[str, float]]:
+    # Each client keeps one connection open and alternates a transaction
+    # batch with a stats query, timing every round trip. Clients pay each
+    # other around a ring, so mined blocks hand the coins back and senders
+    # never run dry while the miner has work.
+    async def client(sender: str, recipient: str, latencies: Dict[str, List[float]]):
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while time.perf_counter() < deadline:
+                batch = [{"sender": sender, "recipient": recipient, "amount": 1}] * batch_size
+                start = time.perf_counter()
+                _, response = await http_request(reader, writer, "POST", "/transactions", batch)
+                latencies["submit"].append(time.perf_counter() - start)
+                submitted[0] += batch_size
+                accepted[0] += sum(response["accepted"])
+
+                start = time.perf_counter()
+                await http_request(reader, writer, "GET", "/stats")
+                latencies["query"].append(time.perf_counter() - start)
+        finally:
+            writer.close()
+
+    reader, writer = await asyncio.open_connection(host, port)
+    addresses = [(await http_request(reader, writer, "POST", "/accounts"))[1]["address"]
+                 for _ in range(max(clients, 2))]
+    _, before = await http_request(reader, writer, "GET", "/stats")
+
+    latencies = {"submit": [], "query": []}
+    submitted, accepted = [0], [0]
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(client(addresses[i], addresses[(i + 1) % len(addresses)], latencies)
+                           for i in range(clients)))
+
+    _, after = await http_request(reader, writer, "GET", "/stats")
+    writer.close()
+
+    results = {kind: _summarize(values) for kind, values in latencies.items()}
+    results["node"] = {
+        "transactions_submitted": submitted[0],
+        "transactions_accepted": accepted[0],
+        "blocks_added": after["total_blocks"] - before["total_blocks"],
+        "blocks_abandoned": after["blocks_abandoned"] - before["blocks_abandoned"],
+        "mining_seconds": after["mining_seconds"] - before["mining_seconds"]
+    }
+    return results
+
+def _print_results(results: Dict[str, Dict[str, float]], duration: float):
+    for kind in ("submit", "query"):
+        summary = results[kind]
+        if not summary["requests"]:
+            print(f"{kind:>6}: no requests completed")
+            continue
+        print(f"{kind:>6}: {summary['requests']} requests ({summary['requests'] / duration:,.0f}/s)  "
+              f"mean {summary['mean_ms']:.2f} ms  p50 {summary['p50_ms']:.2f} ms  "
+              f"p95 {summary['p95_ms']:.2f} ms  p99 {summary['p99_ms']:.2f} ms  max {summary['max_ms']:.2f} ms")
+    node = results["node"]
+    print(f"Accepted {node['transactions_accepted']:,} of {node['transactions_submitted']:,} transactions, "
+          f"{node['blocks_added']} blocks added while under load")
+    print(f"Mining ran for {node['mining_seconds']:.2f} of {duration:.2f} seconds "
+          f"({node['mining_seconds'] / duration:.0%})")
+
+async def _serve(args):
+    blockchain = Blockchain(args.data_dir)
+    blockchain.difficulty = args.difficulty
+    if args.target_interval:
+        blockchain.retargeter = Retargeter(args.target_interval, args.window, initial_difficulty=args.difficulty)
+    node = NodeService(blockchain, chunk_size=args.chunk_size)
+    await node.start(args.host, args.port)
+    print(f"Node listening on http://{args.host}:{node.port}, mining to {node.miner_address}")
+
+    try:
+        if args.load_test:
+            print(f"Running load test: {args.clients} clients for {args.load_test:.0f} seconds")
+            results = await run_load(args.host, node.port, args.clients, args.load_test, args.batch_size)
+            _print_results(results, args.load_test)
+        else:
+            await asyncio.Event().wait()
+    finally:
+        await node.stop()
+        if blockchain.store is not None:
+            blockchain.store.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a blockchain node that mines while serving HTTP requests')
+    parser.add_argument('--host', type=str, default="127.0.0.1",
+                      help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                      help=f'Port to listen on (default: {DEFAULT_PORT}, 0 for any free port)')
+    parser.add_argument('--data-dir', type=str, default=None,
+                      help='Directory to persist the chain in (default: in memory only)')
+    parser.add_argument('--difficulty', type=float, default=4,
+                      help='Leading zero hex digits required of block hashes (default: 4)')
+    parser.add_argument('--target-interval', type=float, default=None, metavar='SECONDS',
+                      help='Retarget difficulty toward this block interval, starting from --difficulty')
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW,
+                      help=f'Recent blocks the retargeting hash rate estimate uses (default: {DEFAULT_WINDOW})')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_MINING_CHUNK,
+                      help=f'Nonces per mining step between tip checks (default: {DEFAULT_MINING_CHUNK})')
+    parser.add_argument('--load-test', type=float, default=None, metavar='SECONDS',
+                      help='Run the load generator against the node for this long, then exit')
+    parser.add_argument('--clients', type=int, default=8,
+                      help='Concurrent load generator connections (default: 8)')
+    parser.add_argument('--batch-size', type=int, default=100,
+                      help='Transactions per submit request in the load test (default: 100)')
+
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
+
+# python node_service.py --port 8545
+# python node_service.py --port 0 --load-test 10 --clients 16
+# python node_service.py --port 0 --difficulty 3 --target-interval 2
+# curl -X POST localhost:8545/transactions -d '{"sender": "0x...", "recipient": "0x...", "amount": 5}'
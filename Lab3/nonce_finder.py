@@ -1,21 +1,181 @@
 import hashlib
+import json
 import time
 import argparse
-from typing import Tuple
+import multiprocessing
+from collections import deque
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, Tuple, Union
+from hashing import MidstateHasher, NonceCounter
+from difficulty import Target
+import batch_sha256
+
+# Nonces handed to a worker at a time in parallel mode
+DEFAULT_CHUNK_SIZE = 50_000
+
+BACKENDS = ("scalar", "batch")
+
+class SearchResult(NamedTuple):
+    nonce: int
+    hash: str
+    time_taken: float
+    hashes: int
+
+    @property
+    def hashes_per_second(self) -> float:
+        return self.hashes / self.time_taken if self.time_taken > 0 else 0.0
+
+def _scan(data: str, target: Target, start: int, stop: int) -> Tuple[Optional[int], Optional[str], int]:
+    # Check nonces in [start, stop) and stop at the first match. The data is
+    # absorbed once; each attempt only feeds the nonce digits.
+    hasher = MidstateHasher(data.encode())
+    counter = NonceCounter(start)
+    digits = counter.digits
+    is_met = target.is_met
+
+    while counter.value < stop:
+        digest = hasher.digest(digits)
+
+        if is_met(digest):
+            return counter.value, digest.hex(), counter.value - start + 1
+
+        counter.increment()
+
+    return None, None, stop - start
+
+def _scan_batch(data: str, target: Target, start: int, stop: int) -> Tuple[Optional[int], Optional[str], int]:
+    # Same contract as _scan, hashing thousands of nonces per NumPy call
+    hasher = batch_sha256.BatchHasher(data.encode())
+
+    for batch_start in range(start, stop, batch_sha256.DEFAULT_BATCH_SIZE):
+        count = min(batch_sha256.DEFAULT_BATCH_SIZE, stop - batch_start)
+        nonce, digest = hasher.sweep(batch_start, count, target)
+        if nonce is not None:
+            return nonce, digest.hex(), nonce - start + 1
+
+    return None, None, stop - start
+
+def _resolve_backend(backend: str):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    # The per-nonce loop is the fallback when NumPy is not installed
+    if backend == "batch" and batch_sha256.available():
+        return _scan_batch
+    return _scan
+
+# Shared state for pool workers, set once per process by _init_worker
+_best_nonce = None
+_next_chunk = None
+
+def _init_worker(best_nonce, next_chunk):
+    global _best_nonce, _next_chunk
+    _best_nonce = best_nonce
+    _next_chunk = next_chunk
+
+def _search_worker(data: str, target: Target, chunk_size: int, backend: str) -> int:
+    scan = _resolve_backend(backend)
+    hashes = 0
 
-def find_nonce(data: str, prefix: str) -> Tuple[int, str, float]:
-    start_time = time.time()
-    nonce = 0
-    
     while True:
-        string_to_hash = f"{data}{nonce}"
-        hash_result = hashlib.sha256(string_to_hash.encode()).hexdigest()
-        
-        if hash_result.startswith(prefix):
-            end_time = time.time()
-            return nonce, hash_result, end_time - start_time
-        
-        nonce += 1
+        # Claim the next unsearched chunk of the nonce space
+        with _next_chunk.get_lock():
+            start = _next_chunk.value * chunk_size
+            _next_chunk.value += 1
+
+        # Chunks beyond the best match so far cannot hold a smaller nonce
+        if start >= _best_nonce.value:
+            return hashes
+
+        nonce, _, attempts = scan(data, target, start, start + chunk_size)
+        hashes += attempts
+
+        if nonce is not None:
+            with _best_nonce.get_lock():
+                if nonce < _best_nonce.value:
+                    _best_nonce.value = nonce
+            return hashes
+
+def search_nonce(data: str, prefix: Union[str, Target], workers: int = 1,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, backend: str = "scalar") -> SearchResult:
+    start_time = time.time()
+    target = prefix if isinstance(prefix, Target) else Target.from_hex_prefix(prefix)
+    scan = _resolve_backend(backend)
+
+    if workers <= 1:
+        nonce = 0
+        while True:
+            found, hash_result, attempts = scan(data, target, nonce, nonce + chunk_size)
+            if found is not None:
+                return SearchResult(found, hash_result, time.time() - start_time, found + 1)
+            nonce += chunk_size
+
+    # Workers claim chunks in increasing order, so once every worker has
+    # stopped no chunk below the best match is left unsearched and the
+    # smallest matching nonce is returned regardless of scheduling.
+    best_nonce = multiprocessing.Value('q', 2**63 - 1)
+    next_chunk = multiprocessing.Value('q', 0)
+
+    with multiprocessing.Pool(workers, initializer=_init_worker,
+                              initargs=(best_nonce, next_chunk)) as pool:
+        jobs = [pool.apply_async(_search_worker, (data, target, chunk_size, backend)) for _ in range(workers)]
+        hashes = sum(job.get() for job in jobs)
+
+    nonce = best_nonce.value
+    hash_result = hashlib.sha256(f"{data}{nonce}".encode()).hexdigest()
+    return SearchResult(nonce, hash_result, time.time() - start_time, hashes)
+
+def find_nonce(data: str, prefix: Union[str, Target], workers: int = 1,
+               backend: str = "scalar") -> Tuple[int, str, float]:
+    result = search_nonce(data, prefix, workers=workers, backend=backend)
+    return result.nonce, result.hash, result.time_taken
+
+def _solve(data: str, target: Target, backend: str) -> Dict:
+    result = search_nonce(data, target, backend=backend)
+    return {"data": data, "nonce": result.nonce, "hash": result.hash,
+            "hashes": result.hashes, "time_taken": result.time_taken}
+
+def solve_batch(inputs: Iterable[str], prefix: Union[str, Target], workers: int = 1,
+                backend: str = "scalar") -> Iterator[Dict]:
+    # Solve each input on a single worker, spreading inputs across the pool
+    # rather than splitting one search. Results come back in input order and
+    # only a few inputs per worker are in flight, so inputs can be streamed.
+    target = prefix if isinstance(prefix, Target) else Target.from_hex_prefix(prefix)
+    if workers <= 1:
+        for data in inputs:
+            yield _solve(data, target, backend)
+        return
+
+    with multiprocessing.Pool(workers) as pool:
+        pending = deque()
+        for data in inputs:
+            pending.append(pool.apply_async(_solve, (data, target, backend)))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+def _read_inputs(path: str) -> Iterator[str]:
+    # One data string per line; blank lines are skipped
+    with open(path, encoding="utf-8") as f:
+        for raw in f:
+            line = raw.rstrip("\r\n")
+            if line:
+                yield line
+
+def run_batch(input_path: str, output_path: str, target: Target, workers: int, backend: str):
+    start_time = time.time()
+    solved = hashes = 0
+    with open(output_path, "w", encoding="utf-8") as output:
+        for record in solve_batch(_read_inputs(input_path), target, workers, backend):
+            output.write(json.dumps(record) + "\n")
+            solved += 1
+            hashes += record["hashes"]
+    elapsed = time.time() - start_time
+
+    print(f"Inputs solved: {solved:,}")
+    print(f"Time taken: {elapsed:.2f} seconds ({solved / elapsed if elapsed > 0 else 0:,.1f} inputs/s)")
+    print(f"Hashes computed: {hashes:,}")
+    print(f"Hash rate: {hashes / elapsed if elapsed > 0 else 0:,.0f} H/s")
+    print(f"Results written to {output_path}")
 
 def main():
     parser = argparse.ArgumentParser(description='Find a nonce that produces a hash with a given prefix')
@@ -23,22 +183,60 @@ def main():
                       help='The data to hash (default: "Hello, Blockchain!")')
     parser.add_argument('--prefix', type=str, default="0000",
                       help='The prefix that the hash should start with (default: "0000")')
-    
+    parser.add_argument('--bits', type=float, default=None,
+                      help='Require this many leading zero bits instead of a prefix (may be fractional)')
+    parser.add_argument('--workers', type=int, default=1,
+                      help='Number of worker processes to search with (default: 1, 0 for all cores)')
+    parser.add_argument('--backend', choices=BACKENDS, default="scalar",
+                      help='Hash one nonce per call or NumPy batches of nonces (default: scalar)')
+    parser.add_argument('--input', type=str, default=None,
+                      help='Solve every line of this file instead of --data, one input per worker')
+    parser.add_argument('--output', type=str, default="nonce_results.jsonl",
+                      help='Where --input writes one JSON result per line (default: nonce_results.jsonl)')
+    parser.add_argument('--compare-backends', action='store_true',
+                      help='Measure scalar and batched hash throughput and exit')
+
     args = parser.parse_args()
-    
-    print(f"\nFinding nonce for prefix: {args.prefix}")
-    nonce, hash_result, time_taken = find_nonce(args.data, args.prefix)
-    
+
+    if args.compare_backends:
+        if not batch_sha256.available():
+            print("NumPy is not installed; only the scalar backend is available")
+            return
+        scalar_rate, batch_rate = batch_sha256.compare_throughput(args.data)
+        print(f"Scalar backend: {scalar_rate:,.0f} H/s")
+        print(f"Batch backend:  {batch_rate:,.0f} H/s ({batch_rate / scalar_rate:.2f}x)")
+        return
+
+    workers = args.workers if args.workers > 0 else multiprocessing.cpu_count()
+
+    if args.bits is not None:
+        target = Target.from_leading_zero_bits(args.bits)
+        print(f"\nFinding nonce for {args.bits} leading zero bits using {workers} worker(s)")
+    else:
+        target = Target.from_hex_prefix(args.prefix)
+        print(f"\nFinding nonce for prefix: {args.prefix} using {workers} worker(s)")
+
+    if args.input:
+        run_batch(args.input, args.output, target, workers, args.backend)
+        return
+
+    result = search_nonce(args.data, target, workers=workers, backend=args.backend)
+
     print(f"Data: {args.data}")
-    print(f"Nonce: {nonce}")
-    print(f"Hash: {hash_result}")
-    print(f"Time taken: {time_taken:.2f} seconds")
-    
-    verification = hashlib.sha256(f"{args.data}{nonce}".encode()).hexdigest()
+    print(f"Nonce: {result.nonce}")
+    print(f"Hash: {result.hash}")
+    print(f"Time taken: {result.time_taken:.2f} seconds")
+    print(f"Hashes computed: {result.hashes}")
+    print(f"Hash rate: {result.hashes_per_second:,.0f} H/s")
+
+    verification = hashlib.sha256(f"{args.data}{result.nonce}".encode()).hexdigest()
     print(f"Verification: {verification}")
-    print(f"Verification successful: {verification == hash_result}")
+    print(f"Verification successful: {verification == result.hash}")
 
 if __name__ == "__main__":
-    main() 
+    main()
 
-# python nonce_finder.py --data "Hello Blockchain" --prefix "0000"
\ No newline at end of file
+# python nonce_finder.py --data "Hello Blockchain" --prefix "0000"
+# python nonce_finder.py --data "Hello Blockchain" --prefix "000000" --workers 32
+# python nonce_finder.py --data "Hello Blockchain" --prefix "000000" --backend batch
+# python nonce_finder.py --input inputs.txt --prefix "0000" --workers 8 --output results.jsonl
@@ -0,0 +1,342 @@
+import argparse
+import asyncio
+import multiprocessing
+import random
+import statistics
+import time
+from typing import Dict, List, Optional, Tuple
+from blockchain import Block, Blockchain
+from serialization import Transaction
+from node_service import MAX_RANGE, NodeService, http_request
+
+# Seconds a gossip or sync request may take before the peer is skipped
+PEER_TIMEOUT = 10.0
+HOST = "127.0.0.1"
+
+class PeerNode(NodeService):
+    """A NodeService that gossips with other nodes over localhost.
+
+    Newly accepted transactions and blocks are relayed to every peer except
+    the one they came from; duplicates stop the flood because the mempool
+    and the chain reject anything already seen. A block that does not
+    extend the tip starts a range sync from its sender, and the fetched
+    branch replaces the local one if it carries more work.
+    """
+
+    def __init__(self, blockchain: Blockchain, **kwargs):
+        super().__init__(blockchain, **kwargs)
+        self.peers: List[int] = []
+        # Block hash -> wall-clock time this node first had it
+        self.block_seen: Dict[str, float] = {}
+        self.mined_hashes: List[str] = []
+        self.reorgs = 0
+        self.stopped = asyncio.Event()
+        self._links: Dict[int, Tuple[asyncio.StreamReader, asyncio.StreamWriter, asyncio.Lock]] = {}
+        self._sync_lock = asyncio.Lock()
+        self._gossip_tasks = set()
+        # Peers a sync is already queued or running for
+        self._syncing = set()
+
+    async def stop(self):
+        for task in list(self._gossip_tasks):
+            task.cancel()
+        for _, writer, _ in self._links.values():
+            writer.close()
+        await super().stop()
+
+    async def _request(self, peer: int, method: str, path: str, payload=None):
+        # One kept-alive connection per peer, used by one request at a time
+        if peer not in self._links:
+            reader, writer = await asyncio.open_connection(HOST, peer)
+            self._links[peer] = (reader, writer, asyncio.Lock())
+        reader, writer, lock = self._links[peer]
+        async with lock:
+            try:
+                _, response = await asyncio.wait_for(
+                    http_request(reader, writer, method, path, payload), PEER_TIMEOUT)
+            except (ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                if self._links.get(peer, (None, writer))[1] is writer:
+                    self._links.pop(peer, None)
+                writer.close()
+                raise
+        return response
+
+    def _broadcast(self, path: str, payload, exclude=None):
+        async def send(peer):
+            try:
+                await self._request(peer, "POST", path, payload)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                pass
+
+        for peer in self.peers:
+            if peer != exclude:
+                self._spawn(send(peer))
+
+    def _spawn(self, coroutine):
+        # Background tasks are kept referenced until done and cancelled on stop
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._gossip_tasks.add(task)
+        task.add_done_callback(self._gossip_tasks.discard)
+
+    def block_added(self, block: Block, origin):
+        self.block_seen.setdefault(block.hash, time.time())
+        if origin is None:
+            self.mined_hashes.append(block.hash)
+        self._broadcast("/blocks", {"block": block.to_dict(), "origin": self.port}, exclude=origin)
+
+    def transactions_added(self, transactions: List[Transaction], origin):
+        self._broadcast("/transactions", {"transactions": [tx.to_dict() for tx in transactions],
+                                          "origin": self.port}, exclude=origin)
+
+    async def accept_block(self, block: Block, origin) -> bool:
+        if self.blockchain.get_block_by_hash(block.hash) is not None:
+            return False
+        if await super().accept_block(block, origin):
+            return True
+        # A block that does not extend the tip may head a branch with more
+        # work; fetch the branch from the node that sent it. The sync runs
+        # in the background: the sender waits for this reply, so fetching
+        # from it before replying could deadlock two nodes syncing at once.
+        if origin is not None and block.index >= len(self.blockchain.chain) - 1 and origin not in self._syncing:
+            self._syncing.add(origin)
+            self._spawn(self._background_sync(origin, block.index))
+        return False
+
+    async def _background_sync(self, peer: int, height: int):
+        try:
+            await self.sync_from(peer, height)
+        finally:
+            self._syncing.discard(peer)
+
+    async def _fetch(self, peer: int, start: int, count: int) -> List[Dict]:
+        return await self._request(peer, "GET", f"/blocks?start={start}&count={count}")
+
+    async def _find_fork(self, peer: int, height: int) -> Optional[int]:
+        # Walk back from height in growing batches until a block matches the
+        # local chain; the fork point is the height just after it
+        chain = self.blockchain.chain
+        step = 16
+        while height >= 0:
+            start = max(0, height - step + 1)
+            for record in reversed(await self._fetch(peer, start, height - start + 1)):
+                if record["index"] < len(chain) and chain[record["index"]].hash == record["hash"]:
+                    return record["index"] + 1
+            height = start - 1
+            step = min(step * 2, MAX_RANGE)
+        return None
+
+    async def sync_from(self, peer: int, height: int) -> int:
+        # Range-sync the peer's chain from the fork point up to its tip and
+        # adopt it if it has more work. Returns the number of blocks adopted.
+        async with self._sync_lock:
+            try:
+                fork = await self._find_fork(peer, min(height, len(self.blockchain.chain) - 1))
+                if fork is None:
+                    return 0
+                blocks = []
+                while True:
+                    records = await self._fetch(peer, fork + len(blocks), MAX_RANGE)
+                    blocks.extend(Block.from_dict(record) for record in records)
+                    if len(records) < MAX_RANGE:
+                        break
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                return 0
+
+            reorganized = fork < len(self.blockchain.chain)
+            if not blocks or not self.blockchain.reorganize(fork, blocks):
+                return 0
+            if reorganized:
+                self.reorgs += 1
+            now = time.time()
+            for block in blocks:
+                self.block_seen.setdefault(block.hash, now)
+            self.blocks_received += len(blocks)
+            self._broadcast("/blocks", {"block": blocks[-1].to_dict(), "origin": self.port}, exclude=peer)
+            return len(blocks)
+
+    async def _route(self, method: str, path: str, payload) -> Tuple[int, object]:
+        if method == "POST" and path == "/peers":
+            self.peers = [peer for peer in payload if peer != self.port]
+            return 200, {"peers": self.peers}
+        if method == "POST" and path == "/sync":
+            start = time.perf_counter()
+            tip = (await self._request(payload["peer"], "GET", "/stats"))["total_blocks"] - 1
+            blocks = await self.sync_from(payload["peer"], tip)
+            return 200, {"blocks": blocks, "seconds": time.perf_counter() - start}
+        if method == "GET" and path == "/seen":
+            return 200, {"seen": self.block_seen, "mined": self.mined_hashes, "reorgs": self.reorgs}
+        if method == "POST" and path == "/shutdown":
+            self.stopped.set()
+            return 200, {}
+        return await super()._route(method, path, payload)
+
+def _run_node(genesis_timestamp: float, difficulty: float, ports):
+    async def run():
+        blockchain = Blockchain(genesis_timestamp=genesis_timestamp)
+        blockchain.difficulty = difficulty
+        node = PeerNode(blockchain)
+        await node.start(HOST, 0)
+        ports.put(node.port)
+        await node.stopped.wait()
+        await node.stop()
+
+    asyncio.run(run())
+
+class Network:
+    """N node processes sharing a genesis block, driven over HTTP."""
+
+    def __init__(self, node_count: int, difficulty: float, degree: int, genesis_timestamp: float):
+        self.genesis_timestamp = genesis_timestamp
+        self.difficulty = difficulty
+        self.degree = degree
+        self.ports: List[int] = []
+        self.processes: List[multiprocessing.Process] = []
+        self._connections = {}
+        for _ in range(node_count):
+            self.ports.append(self.spawn())
+
+    def spawn(self) -> int:
+        ports = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_run_node, args=(self.genesis_timestamp, self.difficulty, ports))
+        process.start()
+        self.processes.append(process)
+        return ports.get()
+
+    async def request(self, port: int, method: str, path: str, payload=None):
+        if port not in self._connections:
+            self._connections[port] = await asyncio.open_connection(HOST, port)
+        reader, writer = self._connections[port]
+        return (await http_request(reader, writer, method, path, payload))[1]
+
+    async def connect(self):
+        # Each node relays to its neighbours on a ring, up to degree away on
+        # either side
+        count = len(self.ports)
+        for i, port in enumerate(self.ports):
+            neighbours = {self.ports[(i + offset) % count]
+                          for step in range(1, self.degree + 1) for offset in (step, -step)}
+            await self.request(port, "POST", "/peers", sorted(neighbours - {port}))
+
+    async def shutdown(self):
+        # Stop all gossip first so no node relays to one that has exited
+        for port in self.ports:
+            try:
+                await self.request(port, "POST", "/peers", [])
+            except (OSError, asyncio.IncompleteReadError):
+                pass
+        for port in self.ports:
+            try:
+                await self.request(port, "POST", "/shutdown")
+            except (OSError, asyncio.IncompleteReadError):
+                pass
+        for _, writer in self._connections.values():
+            writer.close()
+        for process in self.processes:
+            process.join()
+
+def _percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+async def simulate(node_count: int, duration: float = 10.0, difficulty: float = 3.5, degree: int = 2,
+                   accounts: int = 50, rate: float = 200.0, settle: float = 10.0) -> Dict[str, float]:
+    network = Network(node_count, difficulty, degree, time.time())
+    try:
+        await network.connect()
+
+        # Every node knows every account, so transactions are valid anywhere
+        addresses = [f"0x{random.getrandbits(256):064x}" for _ in range(accounts)]
+        for port in network.ports:
+            for address in addresses:
+                await network.request(port, "POST", "/accounts", {"address": address})
+
+        # Submit random transfers at the given rate to random nodes
+        interval = 1.0 / rate
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            sender, recipient = random.sample(addresses, 2)
+            await network.request(random.choice(network.ports), "POST", "/transactions",
+                                  {"sender": sender, "recipient": recipient, "amount": 1})
+            await asyncio.sleep(interval)
+
+        # Let gossip and mining drain until every node has the same tip
+        deadline = time.perf_counter() + settle
+        while True:
+            stats = [await network.request(port, "GET", "/stats") for port in network.ports]
+            if len({s["tip"] for s in stats}) == 1 and not any(s["pending_transactions"] for s in stats):
+                break
+            if time.perf_counter() > deadline:
+                break
+            await asyncio.sleep(0.2)
+
+        reports = [await network.request(port, "GET", "/seen") for port in network.ports]
+        height = stats[0]["total_blocks"]
+        main_chain = []
+        for start in range(0, height, MAX_RANGE):
+            main_chain += [record["hash"] for record in
+                           await network.request(network.ports[0], "GET", f"/blocks?start={start}&count={MAX_RANGE}")]
+        in_main_chain = set(main_chain)
+
+        # Propagation: from the first node having a block to the last
+        latencies = []
+        for block_hash in main_chain[1:]:
+            seen = [report["seen"][block_hash] for report in reports if block_hash in report["seen"]]
+            if len(seen) == node_count:
+                latencies.append(max(seen) - min(seen))
+        mined = [block_hash for report in reports for block_hash in report["mined"]]
+        orphaned = [block_hash for block_hash in mined if block_hash not in in_main_chain]
+
+        # Sync throughput: a fresh node range-syncs the whole chain
+        fresh = network.spawn()
+        network.ports.append(fresh)
+        sync = await network.request(fresh, "POST", "/sync", {"peer": network.ports[0]})
+
+        return {
+            "nodes": node_count,
+            "height": height,
+            "converged": len({s["tip"] for s in stats}) == 1,
+            "blocks_mined": len(mined),
+            "orphan_rate": len(orphaned) / len(mined) if mined else 0.0,
+            "reorgs": sum(report["reorgs"] for report in reports),
+            "propagation_p50_ms": _percentile(latencies, 0.50) * 1000,
+            "propagation_p95_ms": _percentile(latencies, 0.95) * 1000,
+            "propagation_mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+            "sync_blocks": sync["blocks"],
+            "sync_blocks_per_second": sync["blocks"] / sync["seconds"] if sync["seconds"] > 0 else 0.0
+        }
+    finally:
+        await network.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate a network of mining nodes gossiping over localhost')
+    parser.add_argument('--nodes', type=int, nargs='+', default=[2, 4, 8],
+                      help='Node counts to simulate, one run each (default: 2 4 8)')
+    parser.add_argument('--duration', type=float, default=10.0,
+                      help='Seconds of transaction load per run (default: 10)')
+    parser.add_argument('--difficulty', type=float, default=3.5,
+                      help='Leading zero hex digits required of block hashes (default: 3.5)')
+    parser.add_argument('--degree', type=int, default=2,
+                      help='Ring neighbours each node relays to on either side (default: 2)')
+    parser.add_argument('--rate', type=float, default=200.0,
+                      help='Transactions submitted per second (default: 200)')
+    parser.add_argument('--accounts', type=int, default=50,
+                      help='Accounts transferring coins between each other (default: 50)')
+
+    args = parser.parse_args()
+
+    print(f"{'nodes':>5} {'height':>6} {'mined':>6} {'orphans':>8} {'reorgs':>6} "
+          f"{'prop p50':>9} {'prop p95':>9} {'sync':>12}")
+    for node_count in args.nodes:
+        result = asyncio.run(simulate(node_count, args.duration, args.difficulty, args.degree,
+                                      args.accounts, args.rate))
+        note = "" if result["converged"] else "  (did not converge)"
+        print(f"{result['nodes']:>5} {result['height']:>6} {result['blocks_mined']:>6} "
+              f"{result['orphan_rate']:>8.1%} {result['reorgs']:>6} "
+              f"{result['propagation_p50_ms']:>7.1f}ms {result['propagation_p95_ms']:>7.1f}ms "
+              f"{result['sync_blocks_per_second']:>7,.0f} blk/s{note}")
+
+if __name__ == "__main__":
+    main()
+
+# python p2p_network.py --nodes 2 4 8 --duration 10
+# python p2p_network.py --nodes 16 --degree 3 --difficulty 4
@@ -0,0 +1,172 @@
+import argparse
+import math
+import random
+import statistics
+import time
+from typing import Dict, Optional, Sequence
+from difficulty import HASH_BITS
+
+# Seconds between blocks the difficulty steers toward, and the number of
+# recent block intervals the hash rate is estimated from
+DEFAULT_TARGET_INTERVAL = 10.0
+DEFAULT_WINDOW = 30
+
+class Retargeter:
+    """Picks each block's difficulty from the times of the blocks before it.
+
+    Block timestamps are taken when mining starts, so the gap between two
+    consecutive timestamps is the time the earlier block took to mine.
+    Over the last window gaps the expected hashes of those blocks divided
+    by the time they took estimates the network hash rate; the next block
+    gets the leading zero bits that rate needs target_interval seconds to
+    find. The result is rounded to step_bits (1 bit by default, a quarter
+    of a hex digit), moves at most max_step_bits from the previous block
+    and stays within [min_difficulty, max_difficulty]. The first block
+    after genesis has no history and takes initial_difficulty.
+    """
+
+    def __init__(self, target_interval: float = DEFAULT_TARGET_INTERVAL, window: int = DEFAULT_WINDOW,
+                 step_bits: float = 1.0, max_step_bits: float = 2.0,
+                 min_difficulty: float = 0.0, max_difficulty: float = HASH_BITS / 8,
+                 initial_difficulty: float = 4):
+        if target_interval <= 0 or window < 1 or step_bits <= 0 or max_step_bits < step_bits:
+            raise ValueError("Retargeting needs a positive interval, window and step, "
+                             "and max_step_bits of at least step_bits")
+        self.target_interval = target_interval
+        self.window = window
+        self.step_bits = step_bits
+        self.max_step_bits = max_step_bits
+        self.min_difficulty = min_difficulty
+        self.max_difficulty = max_difficulty
+        self.initial_difficulty = initial_difficulty
+
+    def next_difficulty(self, timestamps: Sequence[float], difficulties: Sequence[float]) -> float:
+        # timestamps and difficulties of the most recent blocks, oldest
+        # first, ending at the tip; at most window + 1 of them are used
+        timestamps = timestamps[-self.window - 1:]
+        difficulties = difficulties[-self.window - 1:]
+        previous = difficulties[-1]
+        if len(timestamps) < 2:
+            return previous
+
+        # Blocks from other nodes may carry clocks that run behind, so the
+        # span is floored rather than trusted to be positive
+        span = max(timestamps[-1] - timestamps[0], self.target_interval / 1000)
+        work = sum(2 ** (4 * difficulty) for difficulty in difficulties[:-1])
+        # Block times are exponentially distributed, so work / span over n
+        # intervals overestimates the hash rate by n / (n - 1)
+        intervals = len(timestamps) - 1
+        if intervals > 1:
+            work *= (intervals - 1) / intervals
+        ideal_bits = math.log2(work / span * self.target_interval)
+
+        previous_bits = 4 * previous
+        bits = min(max(ideal_bits, previous_bits - self.max_step_bits), previous_bits + self.max_step_bits)
+        bits = round(bits / self.step_bits) * self.step_bits
+        return min(max(bits / 4, self.min_difficulty), self.max_difficulty)
+
+def simulate(retargeter: Retargeter, blocks: int, hashrate: float, initial_difficulty: float,
+             hashrate_changes: Optional[Dict[int, float]] = None, seed: Optional[int] = None) -> Dict:
+    # Draws each block's mining time from the exponential distribution with
+    # mean expected_attempts / hashrate instead of hashing, so thousands of
+    # blocks take well under a second. hashrate_changes maps a block height
+    # to the hash rate from that block on.
+    rng = random.Random(seed)
+    hashrate_changes = hashrate_changes or {}
+    history = retargeter.window + 1
+    timestamps, difficulties, intervals = [], [], []
+    clock = 0.0
+    for height in range(blocks):
+        hashrate = hashrate_changes.get(height, hashrate)
+        if difficulties:
+            difficulty = retargeter.next_difficulty(timestamps[-history:], difficulties[-history:])
+        else:
+            difficulty = initial_difficulty
+        interval = rng.expovariate(hashrate / 2 ** (4 * difficulty))
+        timestamps.append(clock)
+        difficulties.append(difficulty)
+        intervals.append(interval)
+        clock += interval
+    return {"timestamps": timestamps, "difficulties": difficulties, "intervals": intervals}
+
+def summarize(retargeter: Retargeter, result: Dict, settle: int = 0) -> Dict:
+    # Interval statistics over the blocks after the first settle ones
+    intervals = result["intervals"][settle:]
+    target = retargeter.target_interval
+    window_means = [statistics.fmean(intervals[i:i + retargeter.window])
+                    for i in range(0, len(intervals) - retargeter.window + 1, retargeter.window)]
+    return {
+        "blocks": len(intervals),
+        "mean_interval": statistics.fmean(intervals),
+        "median_interval": statistics.median(intervals),
+        "stdev_interval": statistics.pstdev(intervals),
+        # Worst drift of the average over consecutive windows of blocks
+        "worst_window_mean": max(window_means, key=lambda mean: abs(math.log(mean / target)), default=None),
+        "difficulty_changes": sum(a != b for a, b in zip(result["difficulties"], result["difficulties"][1:])),
+        "min_difficulty": min(result["difficulties"][settle:]),
+        "max_difficulty": max(result["difficulties"][settle:])
+    }
+
+def recovery_blocks(retargeter: Retargeter, result: Dict, start: int, tolerance: float = 0.25) -> Optional[int]:
+    # Blocks after start until the mean over a window of blocks comes back
+    # within tolerance of the target interval
+    intervals = result["intervals"]
+    target = retargeter.target_interval
+    for height in range(start, len(intervals) - retargeter.window + 1):
+        mean = statistics.fmean(intervals[height:height + retargeter.window])
+        if abs(mean - target) <= tolerance * target:
+            return height - start
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate difficulty retargeting without real proof of work')
+    parser.add_argument('--blocks', type=int, default=5000,
+                      help='Blocks to simulate per configuration (default: 5000)')
+    parser.add_argument('--target-interval', type=float, default=DEFAULT_TARGET_INTERVAL,
+                      help='Seconds between blocks to steer toward (default: 10)')
+    parser.add_argument('--window', type=int, nargs='+', default=[DEFAULT_WINDOW],
+                      help='Block intervals the hash rate is estimated from; several values are compared')
+    parser.add_argument('--step-bits', type=float, default=1.0,
+                      help='Granularity of difficulty changes in bits (default: 1)')
+    parser.add_argument('--max-step-bits', type=float, default=2.0,
+                      help='Largest change per block in bits (default: 2)')
+    parser.add_argument('--hashrate', type=float, default=500_000,
+                      help='Network hashes per second (default: 500000)')
+    parser.add_argument('--initial-difficulty', type=float, default=4,
+                      help='Difficulty of the first block in hex digits (default: 4)')
+    parser.add_argument('--hashrate-change', type=float, default=None, metavar='FACTOR',
+                      help='Multiply the hash rate by FACTOR halfway through, e.g. miners joining or leaving')
+    parser.add_argument('--seed', type=int, default=None,
+                      help='Random seed for reproducible runs')
+
+    args = parser.parse_args()
+
+    change_at = args.blocks // 2
+    changes = {change_at: args.hashrate * args.hashrate_change} if args.hashrate_change else None
+    # The first blocks are spent finding the hash rate from the initial guess
+    settle = min(max(args.window) * 4, args.blocks // 4)
+
+    print(f"{'Window':>6} {'Mean':>8} {'Median':>8} {'Stdev':>8} {'Worst':>8} {'Changes':>8} "
+          f"{'Difficulty':>12} {'Recovery':>9} {'Sim time':>9}")
+    for window in args.window:
+        retargeter = Retargeter(args.target_interval, window, args.step_bits, args.max_step_bits)
+        start = time.perf_counter()
+        result = simulate(retargeter, args.blocks, args.hashrate, args.initial_difficulty, changes, args.seed)
+        elapsed = time.perf_counter() - start
+        summary = summarize(retargeter, result, settle)
+        recovery = recovery_blocks(retargeter, result, change_at) if changes else None
+        # Fewer settled blocks than the window leave no window to judge
+        worst = summary['worst_window_mean']
+        worst = '-' if worst is None else f"{worst:.2f}s"
+        print(f"{window:>6} {summary['mean_interval']:>7.2f}s {summary['median_interval']:>7.2f}s "
+              f"{summary['stdev_interval']:>7.2f}s {worst:>8} "
+              f"{summary['difficulty_changes']:>8} "
+              f"{summary['min_difficulty']:>5.2f}-{summary['max_difficulty']:<6.2f} "
+              f"{'-' if recovery is None else recovery:>9} {elapsed:>8.2f}s")
+
+if __name__ == "__main__":
+    main()
+
+# python retarget.py --blocks 10000 --window 10 30 60 120
+# python retarget.py --target-interval 30 --hashrate-change 4 --seed 1
+# python retarget.py --step-bits 0.25 --max-step-bits 1
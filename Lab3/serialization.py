@@ -0,0 +1,138 @@
+import hashlib
+import re
+import struct
+import time
+from typing import Dict, List, Sequence
+import metrics
+
+# Transaction Merkle roots are built with the Lab2 MerkleTree
+import lab2_path
+from merkle_tree import MerkleTree
+
+COINBASE_ADDRESS = "0x0000000000000000000000000000000000000000"
+ADDRESS_SIZE = 32
+
+# Blocks up to version 1 hash their JSON form; version 2 hashes the header
+LEGACY_BLOCK_VERSION = 1
+BLOCK_VERSION = 2
+
+# sender, recipient, amount, timestamp in microseconds
+TRANSACTION_RECORD = struct.Struct(">32s32sQQ")
+# version, index, timestamp in microseconds, previous hash, Merkle root of
+# the transactions, account state root after the block, difficulty in
+# leading zero hex digits (a double, so fractional steps hash exactly),
+# nonce. The nonce is last so mining can absorb everything before it once.
+BLOCK_HEADER = struct.Struct(">IQQ32s32s32sdQ")
+NONCE_OFFSET = BLOCK_HEADER.size - 8
+TRANSACTION_COUNT = struct.Struct(">I")
+EMPTY_ROOT = bytes(32)
+
+def encode_address(address: str) -> bytes:
+    value = int(address, 16)
+    if not 0 <= value < 1 << (8 * ADDRESS_SIZE):
+        raise ValueError(f"Address {address!r} does not fit in {ADDRESS_SIZE} bytes")
+    return value.to_bytes(ADDRESS_SIZE, "big")
+
+def decode_address(raw: bytes) -> str:
+    if not any(raw):
+        return COINBASE_ADDRESS
+    return "0x" + raw.hex()
+
+_ADDRESS_PATTERN = re.compile(rf"0x[0-9a-fA-F]{{{2 * ADDRESS_SIZE}}}")
+
+def canonical_address(address: str) -> str:
+    # Accounts are 0x and 64 hex digits, lowercased so each encoded value
+    # has one spelling; any all-zero address is the coinbase
+    if address == COINBASE_ADDRESS:
+        return address
+    if not isinstance(address, str) or not _ADDRESS_PATTERN.fullmatch(address):
+        raise ValueError(f"Address {address!r} is not 0x followed by {2 * ADDRESS_SIZE} hex digits")
+    return decode_address(bytes.fromhex(address[2:]))
+
+def to_microseconds(seconds: float) -> int:
+    return int(round(seconds * 1_000_000))
+
+class Transaction:
+    """Fixed-layout transfer record that encodes to 80 bytes.
+
+    Supports tx["sender"]-style access and ** unpacking so code written
+    against transaction dicts keeps working.
+    """
+
+    __slots__ = ("sender", "recipient", "amount", "timestamp")
+
+    def __init__(self, sender: str, recipient: str, amount: int, timestamp: int = None):
+        self.sender = canonical_address(sender)
+        self.recipient = canonical_address(recipient)
+        self.amount = amount
+        # Integer microseconds since the epoch
+        self.timestamp = to_microseconds(time.time()) if timestamp is None else timestamp
+
+    def encode(self) -> bytes:
+        try:
+            return TRANSACTION_RECORD.pack(encode_address(self.sender), encode_address(self.recipient),
+                                           self.amount, self.timestamp)
+        except struct.error as error:
+            raise ValueError(f"Transaction field out of range: {error}") from None
+
+    @classmethod
+    def decode(cls, raw: bytes) -> "Transaction":
+        sender, recipient, amount, timestamp = TRANSACTION_RECORD.unpack(raw)
+        return cls(decode_address(sender), decode_address(recipient), amount, timestamp)
+
+    def txid(self) -> str:
+        return hashlib.sha256(self.encode()).hexdigest()
+
+    def to_dict(self) -> Dict:
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Transaction":
+        # A missing timestamp means now. Transaction dicts from before the
+        # binary format carry float seconds.
+        timestamp = data.get("timestamp")
+        if isinstance(timestamp, float):
+            timestamp = to_microseconds(timestamp)
+        tx = cls(data["sender"], data["recipient"], data["amount"], timestamp)
+        # Fields that do not fit the binary record raise ValueError here
+        # rather than wherever the transaction is first hashed
+        tx.encode()
+        return tx
+
+    def keys(self):
+        return self.__slots__
+
+    def __getitem__(self, key: str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __eq__(self, other):
+        if not isinstance(other, Transaction):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f"Transaction({self.sender} -> {self.recipient}: {self.amount})"
+
+def transactions_root(transactions: Sequence[Transaction]) -> bytes:
+    if not transactions:
+        return EMPTY_ROOT
+    tree = MerkleTree([tx.encode() for tx in transactions])
+    if metrics.enabled:
+        metrics.MERKLE_LEAF_SECONDS.observe(tree.build_timings["leaves"])
+        metrics.MERKLE_LEVEL_SECONDS.observe(tree.build_timings["levels"])
+    return tree.root
+
+def encode_header(version: int, index: int, timestamp: float, previous_hash: str,
+                  merkle_root: bytes, state_root: str, difficulty: float, nonce: int) -> bytes:
+    try:
+        return BLOCK_HEADER.pack(version, index, to_microseconds(timestamp), bytes.fromhex(previous_hash),
+                                 merkle_root, bytes.fromhex(state_root), difficulty, nonce)
+    except struct.error as error:
+        raise ValueError(f"Block header field out of range: {error}") from None
+
+def encode_block(header: bytes, transactions: Sequence[Transaction]) -> bytes:
+    parts: List[bytes] = [header, TRANSACTION_COUNT.pack(len(transactions))]
+    parts.extend(tx.encode() for tx in transactions)
+    return b"".join(parts)
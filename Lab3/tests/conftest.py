@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The Lab3 modules import each other by name, as when run from Lab3
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# python -m pytest Lab3/tests
@@ -0,0 +1,129 @@
+import time
+import pytest
+import mining
+from blockchain import Block, Blockchain, STARTING_BALANCE, verify_account_proof
+from difficulty import Target
+from serialization import COINBASE_ADDRESS, Transaction
+
+ALICE = "0x" + "a1" * 32
+BOB = "0x" + "b2" * 32
+MINER = "0x" + "c3" * 32
+GENESIS_TIME = 1_700_000_000.0
+DIFFICULTY = 1
+
+def make_chain() -> Blockchain:
+    # Chains built here share a genesis block, so blocks move between them
+    chain = Blockchain(genesis_timestamp=GENESIS_TIME)
+    chain.difficulty = DIFFICULTY
+    for address in (ALICE, BOB, MINER):
+        chain.create_account(address)
+    return chain
+
+def seal(block: Block) -> Block:
+    # Find a nonce for the block's current header fields
+    result = mining.mine(block, Target.from_difficulty(block.difficulty))
+    block.nonce = result.nonce
+    block.hash = result.digest.hex()
+    return block
+
+def forge(chain: Blockchain, transactions, difficulty: float = DIFFICULTY) -> Block:
+    # A sealed block on chain's tip whose state root matches its transactions
+    block = Block(len(chain.chain), transactions, time.time(), chain.chain[-1].hash)
+    block.miner = MINER
+    block.difficulty = difficulty
+    block.state_root = chain._state_root_after(transactions)
+    return seal(block)
+
+def coinbase(amount: int = 100) -> Transaction:
+    return Transaction(COINBASE_ADDRESS, MINER, amount)
+
+def state_of(chain: Blockchain):
+    return (len(chain.chain), chain.state_tree.root, chain.total_coins,
+            {address: account.balance for address, account in chain.accounts.items()})
+
+def test_mined_block_is_received_by_another_node():
+    producer, receiver = make_chain(), make_chain()
+    assert producer.create_transaction(ALICE, BOB, 30)
+    block = producer.mine_pending_transactions(MINER)
+    assert receiver.receive_block(block)
+    assert receiver.get_balance(BOB) == STARTING_BALANCE + 30
+    assert receiver.get_balance(MINER) == STARTING_BALANCE + 100
+    assert receiver.state_tree.root.hex() == block.state_root == producer.state_tree.root.hex()
+
+def test_received_block_may_pay_unknown_accounts():
+    producer, receiver = make_chain(), make_chain()
+    carol = producer.create_account("0x" + "d4" * 32)
+    producer.create_transaction(ALICE, carol, 5)
+    block = producer.mine_pending_transactions(MINER)
+    assert receiver.receive_block(block)
+    assert receiver.get_balance(carol) == STARTING_BALANCE + 5
+
+@pytest.mark.parametrize("transactions", [
+    pytest.param(lambda: [Transaction(ALICE, BOB, 10)], id="no coinbase"),
+    pytest.param(lambda: [coinbase(), Transaction(ALICE, BOB, 10)], id="coinbase not last"),
+    pytest.param(lambda: [coinbase(), coinbase()], id="two coinbases"),
+    pytest.param(lambda: [coinbase(101)], id="coinbase overpays"),
+    pytest.param(lambda: [Transaction(ALICE, BOB, 0), coinbase()], id="zero amount"),
+    pytest.param(lambda: [Transaction(ALICE, BOB, STARTING_BALANCE + 1), coinbase()], id="overspend"),
+])
+def test_receive_block_rejects_broken_transaction_rules(transactions):
+    producer, receiver = make_chain(), make_chain()
+    before = state_of(receiver)
+    assert not receiver.receive_block(forge(producer, transactions()))
+    assert state_of(receiver) == before
+
+def test_receive_block_rejects_lower_difficulty():
+    producer, receiver = make_chain(), make_chain()
+    assert not receiver.receive_block(forge(producer, [coinbase()], difficulty=0))
+    assert len(receiver.chain) == 1
+
+def test_receive_block_rejects_wrong_state_root_and_keeps_state():
+    producer, receiver = make_chain(), make_chain()
+    carol = "0x" + "d4" * 32
+    block = forge(producer, [Transaction(ALICE, carol, 10), coinbase()])
+    block.state_root = "00" * 32
+    seal(block)
+    before = state_of(receiver)
+    assert not receiver.receive_block(block)
+    # Nothing is left behind, not even the account the block would create
+    assert state_of(receiver) == before
+    assert carol not in receiver.accounts
+
+def test_receive_block_rejects_bad_proof_of_work_and_linkage():
+    producer, receiver = make_chain(), make_chain()
+    block = forge(producer, [coinbase()])
+    block.nonce += 1
+    assert not receiver.receive_block(block)
+
+    block = forge(producer, [coinbase()])
+    block.previous_hash = "11" * 32
+    assert not receiver.receive_block(seal(block))
+    assert len(receiver.chain) == 1
+
+def test_account_back_at_starting_balance_is_still_in_the_state():
+    chain = make_chain()
+    local = chain.create_account("0x" + "e5" * 32)
+    chain.create_transaction(ALICE, BOB, 10)
+    chain.mine_pending_transactions(MINER)
+    chain.create_transaction(BOB, ALICE, 10)
+    chain.mine_pending_transactions(MINER)
+    root = chain.chain[-1].state_root
+
+    proof = chain.get_account_proof(ALICE)
+    assert verify_account_proof(ALICE, STARTING_BALANCE, proof, root)
+    assert not verify_account_proof(ALICE, None, proof, root)
+    # An account no block has touched is absent from the state
+    proof = chain.get_account_proof(local)
+    assert verify_account_proof(local, None, proof, root)
+    assert not verify_account_proof(local, STARTING_BALANCE, proof, root)
+
+def test_second_spend_is_rejected_while_the_first_is_mined():
+    chain = make_chain()
+    assert chain.create_transaction(ALICE, BOB, 80)
+    block = chain.prepare_block(MINER)
+    assert not chain.create_transaction(ALICE, MINER, 80)
+    chain.abandon_block(block)
+    assert chain.mempool.pending_spend(ALICE) == 80
+    chain.mine_pending_transactions(MINER)
+    assert chain.get_balance(ALICE) == STARTING_BALANCE - 80
+    assert chain.mempool.pending_spend(ALICE) == 0
@@ -0,0 +1,89 @@
+from mempool import Mempool
+from serialization import Transaction
+
+ALICE = "0x" + "a1" * 32
+BOB = "0x" + "b2" * 32
+
+def transfer(amount: int, timestamp: int, sender: str = ALICE) -> Transaction:
+    return Transaction(sender, BOB, amount, timestamp)
+
+def test_add_checks_balance_minus_pending_spends():
+    pool = Mempool()
+    assert pool.add(transfer(60, 1), balance=100)
+    assert not pool.add(transfer(50, 2), balance=100)
+    assert pool.add(transfer(40, 3), balance=100)
+    assert pool.pending_spend(ALICE) == 100
+
+def test_add_rejects_duplicates():
+    pool = Mempool()
+    tx = transfer(10, 1)
+    assert pool.add(tx, balance=100)
+    assert not pool.add(transfer(10, 1), balance=100)
+    assert len(pool) == 1
+
+def test_taken_transactions_stay_counted_until_removed():
+    pool = Mempool()
+    tx = transfer(80, 1)
+    pool.add(tx, balance=100)
+    assert pool.take(10) == [tx]
+    assert len(pool) == 0
+    # Still a spend while its block is mined: neither a second spend nor
+    # the same transaction resubmitted gets in
+    assert pool.pending_spend(ALICE) == 80
+    assert not pool.add(transfer(30, 2), balance=100)
+    assert not pool.add(transfer(80, 1), balance=100)
+    assert pool.unconfirmed() == [tx]
+
+    pool.remove([tx])
+    assert pool.pending_spend(ALICE) == 0
+    assert pool.unconfirmed() == []
+
+def test_take_is_oldest_first_and_bounded():
+    pool = Mempool()
+    txs = [transfer(1, timestamp) for timestamp in range(5)]
+    for tx in txs:
+        pool.add(tx, balance=100)
+    assert pool.take(3) == txs[:3]
+    assert list(pool) == txs[3:]
+
+def test_requeue_puts_taken_transactions_back_in_front():
+    pool = Mempool()
+    txs = [transfer(10, timestamp) for timestamp in range(4)]
+    for tx in txs:
+        pool.add(tx, balance=100)
+    taken = pool.take(2)
+    pool.requeue(taken)
+    assert list(pool) == txs
+    # Requeueing a taken transaction does not count its spend twice
+    assert pool.pending_spend(ALICE) == 40
+
+def test_requeue_counts_transactions_that_were_not_in_flight():
+    # Transactions of a block replaced in a reorganization were already
+    # released when that block was committed
+    pool = Mempool()
+    tx = transfer(25, 1)
+    pool.add(tx, balance=100)
+    pool.take(1)
+    pool.remove([tx])
+    pool.requeue([tx])
+    assert list(pool) == [tx]
+    assert pool.pending_spend(ALICE) == 25
+
+def test_remove_releases_queued_and_in_flight_spends():
+    pool = Mempool()
+    queued, in_flight = transfer(10, 1), transfer(20, 2)
+    pool.add(in_flight, balance=100)
+    pool.take(1)
+    pool.add(queued, balance=100)
+    pool.remove([queued, in_flight])
+    assert len(pool) == 0
+    assert pool.pending_spend(ALICE) == 0
+
+def test_eviction_releases_spends():
+    pool = Mempool(capacity=2)
+    txs = [transfer(10, timestamp) for timestamp in range(3)]
+    for tx in txs:
+        pool.add(tx, balance=100)
+    assert list(pool) == txs[1:]
+    assert pool.evicted == 1
+    assert pool.pending_spend(ALICE) == 20
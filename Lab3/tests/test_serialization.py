@@ -0,0 +1,39 @@
+import pytest
+from blockchain import Blockchain
+from serialization import COINBASE_ADDRESS, Transaction, canonical_address, decode_address, encode_address
+
+def test_addresses_are_lowercased():
+    lower, upper = "0x" + "ab" * 32, "0x" + "AB" * 32
+    assert canonical_address(upper) == lower
+    assert Transaction(upper, lower, 1, 1).txid() == Transaction(lower, lower, 1, 1).txid()
+    chain = Blockchain()
+    assert chain.create_account(upper) == chain.create_account(lower) == lower
+    assert list(chain.accounts) == [lower]
+
+def test_zero_address_is_the_coinbase():
+    assert canonical_address("0x" + "0" * 64) == COINBASE_ADDRESS
+    tx = Transaction.from_dict({"sender": "0x" + "0" * 64, "recipient": "0x" + "ab" * 32, "amount": 1})
+    assert tx.sender == COINBASE_ADDRESS
+    chain = Blockchain()
+    for address in (COINBASE_ADDRESS, "0x" + "0" * 64):
+        with pytest.raises(ValueError):
+            chain.create_account(address)
+
+@pytest.mark.parametrize("address", ["0x" + "ab" * 20, "ab" * 32, "0x" + "g" * 64, "0x" + "ab" * 33, 5, None])
+def test_malformed_addresses_are_rejected(address):
+    with pytest.raises(ValueError):
+        canonical_address(address)
+    with pytest.raises(ValueError):
+        Transaction.from_dict({"sender": address, "recipient": "0x" + "ab" * 32, "amount": 1})
+
+def test_transaction_round_trips_through_its_encoding():
+    tx = Transaction("0x" + "Cd" * 32, "0x" + "ef" * 32, 42, 1_700_000_000_000_000)
+    assert len(tx.encode()) == 80
+    assert Transaction.decode(tx.encode()) == tx
+    assert decode_address(encode_address(tx.sender)) == tx.sender
+
+@pytest.mark.parametrize("field, value", [("amount", -1), ("amount", 2 ** 64), ("timestamp", -5)])
+def test_fields_outside_the_record_are_rejected(field, value):
+    record = {"sender": "0x" + "ab" * 32, "recipient": "0x" + "cd" * 32, "amount": 1, "timestamp": 1}
+    with pytest.raises(ValueError):
+        Transaction.from_dict({**record, field: value})
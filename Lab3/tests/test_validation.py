@@ -0,0 +1,82 @@
+import pytest
+from blockchain import Blockchain
+from retarget import Retargeter
+from serialization import transactions_root
+from test_blockchain import ALICE, BOB, MINER, make_chain, seal
+
+@pytest.fixture
+def chain() -> Blockchain:
+    chain = make_chain()
+    for amount in range(1, 5):
+        chain.create_transaction(ALICE, BOB, amount)
+        chain.mine_pending_transactions(MINER)
+    return chain
+
+def reseal_from(chain: Blockchain, height: int):
+    # Re-mine blocks from height on after an edit, relinking each to the
+    # block before it, as someone rewriting history would
+    for block in chain.chain[height:]:
+        block.previous_hash = chain.chain[block.index - 1].hash
+        block.merkle_root = transactions_root(block.transactions)
+        seal(block)
+
+def test_clean_chain_validates(chain):
+    for options in ({}, {"full_state": True}, {"workers": 1}):
+        report = chain.validate_chain(**options)
+        assert report.valid, report.errors
+        assert report.blocks_checked == len(chain.chain)
+
+def test_incremental_validation_checks_only_new_blocks(chain):
+    assert chain.validate_chain().valid
+    chain.create_transaction(BOB, ALICE, 1)
+    chain.mine_pending_transactions(MINER)
+    report = chain.validate_chain(incremental=True)
+    assert report.valid, report.errors
+    assert report.blocks_checked == 1
+
+    # A tampered new block is caught from the checkpoint
+    chain.mine_pending_transactions(MINER)
+    chain.chain[-1].transactions[-1].amount = 500
+    reseal_from(chain, len(chain.chain) - 1)
+    assert not chain.validate_chain(incremental=True).valid
+
+def test_edited_block_breaks_its_hash(chain):
+    chain.chain[2].transactions[0].amount = 50
+    errors = chain.validate_chain().errors
+    assert "Block 2: stored hash does not match its contents" in errors
+
+def test_rewritten_block_breaks_the_chain_rules(chain):
+    tip = chain.chain[-1]
+    tip.difficulty = 0
+    tip.transactions[-1].amount = 10 ** 12
+    reseal_from(chain, tip.index)
+    errors = chain.validate_chain().errors
+    assert any("breaks the chain's difficulty rule" in error for error in errors)
+    assert any("not the reward of 100" in error for error in errors)
+    assert any("state root does not match" in error for error in errors)
+    assert f"Account {MINER} balance does not match the chain" in errors
+
+def test_state_roots_checked_at_tip_or_on_every_block(chain):
+    chain.chain[2].state_root = "00" * 32
+    reseal_from(chain, 2)
+    # Only the first and last blocks' roots are compared by default
+    assert chain.validate_chain().valid
+    errors = chain.validate_chain(full_state=True).errors
+    assert errors == ["Block 2: state root does not match the replayed balances"]
+
+    chain.chain[-1].state_root = "00" * 32
+    reseal_from(chain, len(chain.chain) - 1)
+    assert not chain.validate_chain().valid
+
+def test_retargeted_chain_validates():
+    chain = make_chain()
+    chain.retargeter = Retargeter(0.05, 3, initial_difficulty=1)
+    for _ in range(6):
+        chain.mine_pending_transactions(MINER)
+    assert chain.validate_chain(full_state=True).valid
+
+    # A block that ignores the retargeted difficulty is rejected
+    tip = chain.chain[-1]
+    tip.difficulty = chain.expected_difficulty(tip.index) + 0.25
+    reseal_from(chain, tip.index)
+    assert not chain.validate_chain().valid
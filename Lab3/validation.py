@@ -0,0 +1,108 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+from difficulty import Target
+from serialization import BLOCK_VERSION, LEGACY_BLOCK_VERSION
+
+# Blocks checked per pool task, and the chain length below which the pool
+# costs more to start than it saves
+VALIDATION_CHUNK_SIZE = 1000
+PARALLEL_VALIDATION_MIN = 2000
+
+class ValidationReport(NamedTuple):
+    valid: bool
+    blocks_checked: int
+    errors: List[str]
+    # Seconds spent per stage
+    timings: Dict[str, float]
+
+def _check_blocks(block_factory: Callable[[Dict], object], records: Sequence[Dict]) -> List[str]:
+    # Rebuild each block from its stored fields, recompute its hash and
+    # check the hash against the block's own difficulty
+    errors = []
+    for record in records:
+        block = block_factory(record)
+        if block.calculate_hash() != record["hash"]:
+            errors.append(f"Block {record['index']}: stored hash does not match its contents")
+        elif not Target.from_difficulty(record["difficulty"]).is_met(bytes.fromhex(record["hash"])):
+            errors.append(f"Block {record['index']}: hash does not meet difficulty {record['difficulty']}")
+    return errors
+
+def _check_transactions(record: Dict, coinbase_address: str, mining_reward: Optional[int]) -> List[str]:
+    # Every block after genesis ends with its one coinbase payout; all other
+    # transfers move a positive whole amount
+    errors = []
+    transactions = record["transactions"]
+    if record["index"] == 0:
+        if transactions:
+            errors.append("Block 0: genesis block carries transactions")
+        return errors
+    coinbase = [position for position, tx in enumerate(transactions) if tx["sender"] == coinbase_address]
+    if coinbase != [len(transactions) - 1]:
+        errors.append(f"Block {record['index']}: needs exactly one coinbase transaction, placed last")
+    elif mining_reward is not None and transactions[-1]["amount"] != mining_reward:
+        errors.append(f"Block {record['index']}: coinbase pays {transactions[-1]['amount']}, "
+                      f"not the reward of {mining_reward}")
+    for tx in transactions:
+        if not isinstance(tx["amount"], int) or tx["amount"] <= 0:
+            errors.append(f"Block {record['index']}: transaction amount {tx['amount']!r} is not positive")
+    return errors
+
+def validate_records(records: Sequence[Dict], block_factory: Callable[[Dict], object], start_height: int,
+                     previous_hash: str, balances: Dict[str, int], starting_balance: int,
+                     coinbase_address: str, workers: Optional[int] = None, mining_reward: Optional[int] = None,
+                     difficulty_ok: Optional[Callable[[int, float], bool]] = None,
+                     state_root: Optional[Callable[[Dict[str, int]], str]] = None,
+                     full_state: bool = False) -> ValidationReport:
+    # balances holds the replayed balances up to start_height and is updated
+    # in place, so a caller can keep it as an incremental checkpoint.
+    # difficulty_ok(height, difficulty) applies the chain's difficulty rule,
+    # since a block's own difficulty only says what it claims to meet.
+    # state_root(changed) is given the balances changed since its last call
+    # and returns the state root they lead to. Updating the tree costs far
+    # more than the rest of the replay, so by default only the first and
+    # last blocks' roots are compared; full_state=True compares every block.
+    timings = {}
+    errors = []
+
+    stage_start = time.perf_counter()
+    for height, record in enumerate(records, start_height):
+        if record["index"] != height:
+            errors.append(f"Block {height}: stored index is {record['index']}")
+        if record["previous_hash"] != previous_hash:
+            errors.append(f"Block {height}: previous hash does not link to block {height - 1}")
+        previous_hash = record["hash"]
+        if difficulty_ok is not None and height > 0 and not difficulty_ok(height, record["difficulty"]):
+            errors.append(f"Block {height}: difficulty {record['difficulty']} breaks the chain's difficulty rule")
+        errors.extend(_check_transactions(record, coinbase_address, mining_reward))
+    timings["linkage"] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    if workers != 1 and len(records) >= PARALLEL_VALIDATION_MIN:
+        chunks = [records[i:i + VALIDATION_CHUNK_SIZE] for i in range(0, len(records), VALIDATION_CHUNK_SIZE)]
+        with ProcessPoolExecutor(workers) as executor:
+            for chunk_errors in executor.map(_check_blocks, [block_factory] * len(chunks), chunks):
+                errors.extend(chunk_errors)
+    else:
+        errors.extend(_check_blocks(block_factory, records))
+    timings["proof_of_work"] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    changed = {}
+    for position, record in enumerate(records):
+        for tx in record["transactions"]:
+            if tx["sender"] != coinbase_address:
+                balance = balances.get(tx["sender"], starting_balance) - tx["amount"]
+                if balance < 0:
+                    errors.append(f"Block {record['index']}: {tx['sender']} balance goes negative")
+                balances[tx["sender"]] = changed[tx["sender"]] = balance
+            balances[tx["recipient"]] = changed[tx["recipient"]] = \
+                balances.get(tx["recipient"], starting_balance) + tx["amount"]
+        # Blocks from before the state tree have no root to compare
+        if state_root is not None and (full_state or position in (0, len(records) - 1)):
+            root, changed = state_root(changed), {}
+            if record.get("version", LEGACY_BLOCK_VERSION) >= BLOCK_VERSION and record["state_root"] != root:
+                errors.append(f"Block {record['index']}: state root does not match the replayed balances")
+    timings["balances"] = time.perf_counter() - stage_start
+
+    return ValidationReport(not errors, len(records), errors, timings)